@@ -1,9 +1,80 @@
 
 import os
 
-MAX_CONCURRENT_PROCESSES = 4
+INFERENCE_WORKERS = 4  # Facenet worker processes (0 = run inline, e.g. for CLI tools)
+INFERENCE_MAX_PENDING = 8  # Jobs allowed to wait for a busy worker before "Server busy"
+INFERENCE_BATCH_SIZE = 8  # Max frames embedded in one Facenet forward pass
+INFERENCE_BATCH_DELAY_MS = 5  # Max time a frame waits for others to fill its batch
 FRAME_SKIP = 3  # Process every 3rd frame
 MAX_FRAME_WIDTH = 640
+FACE_GATE_ENABLED = True  # Reject frames without a usable face before running Facenet
+FACE_GATE_WIDTH = 320  # Width the face gate's Haar detector runs at
+MIN_FACE_SIZE = 60  # Smallest accepted face, in pixels at MAX_FRAME_WIDTH
+MIN_FACE_SHARPNESS = 30.0  # Variance of the Laplacian below which a face is too blurry
 PROCESSING_TIMEOUT = 5  # seconds
+FRAME_CACHE_ENABLED = True  # Reuse results for repeated (identical or near-identical) frames
+FRAME_CACHE_SIZE = 256  # Max cached frames (least recently used are dropped)
+FRAME_CACHE_TTL = 10  # seconds a cached result stays valid
+FRAME_CACHE_HASH_SIZE = 16  # Frames are hashed from a 16x16 grayscale thumbnail (256-bit hash)
+FRAME_CACHE_MAX_DISTANCE = 4  # Frames whose hashes differ in at most this many bits count as the same
+MATCH_THRESHOLD = 8  # Max L2 distance between a face and a user's template to log in
 DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.json')  # Adjusted path
-LOG_FILE = 'login_logs.json'
\ No newline at end of file
+LOG_FILE = 'login_logs.json'
+LOG_DB_FILE = os.path.splitext(LOG_FILE)[0] + '.db'  # Append-only login log (LOG_FILE is imported once)
+MAX_LOG_PAGE_SIZE = 500  # Upper bound for /api/login-logs?limit=
+MAX_USER_PAGE_SIZE = 500  # Upper bound for /api/users?limit=
+BULK_MAX_IMAGES = 20000  # Upper bound for one /api/register/bulk upload
+BULK_MAX_IMAGE_BYTES = 20 * 1024 * 1024  # Uncompressed size cap per image in a bulk zip (zip bombs)
+# Registration images are kept so users can be re-embedded after a model change (scripts/reembed_gallery.py)
+RETAIN_ENROLLMENT_IMAGES = True
+ENROLLMENT_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'enrollment_images')
+
+METRICS_ENABLED = True  # Per-stage latency histograms and counters, served on /metrics
+
+# User storage: "binary" (float32 rows + metadata sidecar next to DATA_FILE) or "json" (legacy data.json)
+STORAGE_BACKEND = 'binary'
+
+# Facenet runtime: "deepface" (TensorFlow/Keras), or a model exported by scripts/export_facenet.py run
+# with "onnx" (ONNX Runtime) or "tflite". Check an export with scripts/compare_embedding_backends.py
+EMBEDDING_BACKEND = 'deepface'
+ONNX_MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'facenet.onnx')
+TFLITE_MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'facenet.tflite')
+EMBEDDING_THREADS = 0  # CPU threads per inference worker for onnx/tflite (0 = runtime default)
+
+# Face matching backend: "exact" (brute-force L2) or "ivf" (approximate, for very large galleries)
+MATCHER_BACKEND = 'exact'
+IVF_NLIST = 256  # Number of k-means lists
+IVF_NPROBE = 8  # Lists searched per query (higher = better recall, slower)
+IVF_MIN_TRAIN_SIZE = 10000  # Below this the IVF backend searches exactly
+INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ivf_index.npz')
+
+# Per-user templates: a running-mean embedding (what the matcher searches) plus a few exemplars
+TEMPLATE_MAX_EXEMPLARS = 5  # Raw embeddings kept per user for borderline matches
+TEMPLATE_MARGIN = 1.5  # Check exemplars when the best distance is within this of MATCH_THRESHOLD
+TEMPLATE_CANDIDATES = 3  # Closest users re-scored against their exemplars
+TEMPLATE_UPDATE_DISTANCE = 5.0  # Logins closer than this are folded into the user's template
+TEMPLATE_MAX_COUNT = 50  # Newest image weight never drops below 1/TEMPLATE_MAX_COUNT
+TEMPLATE_UPDATE_INTERVAL = 600  # Seconds between login updates of one user's template (each is a durable write)
+TEMPLATE_MIN_NOVELTY = 1.0  # Logins closer than this to the template add nothing and don't update it
+
+# Multi-frame login decision (helpers/consensus.py): several embedded frames must agree before a login
+CONSENSUS_ENABLED = True
+CONSENSUS_WINDOW = 5  # Recent embedded frames of a session that are considered
+CONSENSUS_MIN_FRAMES = 2  # Agreeing frames for a confident login (a majority of the window otherwise)
+CONSENSUS_CONFIDENT_DISTANCE = 6.0  # Mean distance of the agreeing frames for a confident login
+CONSENSUS_MAX_FRAMES = 8  # New embedded frames per attempt before answering "Unknown" (as many cache hits in a row ask the user to move)
+CONSENSUS_REJECT_MARGIN = 3.0  # CONSENSUS_MIN_FRAMES frames this far over MATCH_THRESHOLD end the attempt early
+LIVENESS_ENABLED = True  # Require some natural motion between frames (rejects replayed still images)
+LIVENESS_SIZE = 32  # Motion cues are computed on 32x32 grayscale thumbnails
+LIVENESS_MIN_MOTION = 0.02  # Mean normalised change between frames that counts as motion...
+LIVENESS_MAX_MOTION = 0.8  # ...up to this (more is a different scene)
+LIVENESS_BLINK_RATIO = 3.0  # Eye band changing this much more than the rest of the face is a blink
+LIVENESS_REQUIRE_BLINK = False
+
+# Production launch (scripts/serve.py): WEB_WORKERS processes sharing one port
+WEB_WORKERS = 4  # Each gets INFERENCE_WORKERS // WEB_WORKERS inference processes (at least 1)
+WEB_HOST = '0.0.0.0'
+WEB_PORT = 5000
+# Socket.IO message queue, needed when WEB_WORKERS > 1: "redis://localhost:6379/0", "amqp://...",
+# or "local:///tmp/faceauth-socketio" (no broker; all workers on this machine). None = single process
+SOCKETIO_MESSAGE_QUEUE = None
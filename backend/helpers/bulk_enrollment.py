@@ -0,0 +1,169 @@
+# helpers/bulk_enrollment.py
+
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from helpers.frame_processing import decode_image, face_for_embedding
+from helpers.gallery import add_or_merge_templates
+from helpers.inference_pool import InferenceBusy, _is_green
+from helpers.face_recognition import model_tag
+from helpers.enrollment_images import valid_user_name
+from helpers.templates import new_template
+from config import BULK_MAX_IMAGE_BYTES
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+BUSY_RETRIES = 20  # Times a single image waits for a full inference queue before failing
+
+
+def _label_for(relative_path):
+    """``alice/1.jpg`` -> alice, ``bob.jpg`` -> bob."""
+    parts = relative_path.replace("\\", "/").split("/")
+    if len(parts) > 1:
+        return parts[-2]
+    return os.path.splitext(parts[-1])[0]
+
+
+def _is_image(relative_path):
+    name = os.path.basename(relative_path)
+    if name.startswith(".") or relative_path.startswith("__MACOSX"):
+        return False
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def collect_from_directory(root):
+    """Return ``[(name, relative_path, read_bytes)]`` for the labelled images under ``root``.
+
+    Images in a sub-folder are labelled with the folder name, images directly
+    in ``root`` with their file name (without extension).
+    """
+    items = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            relative_path = os.path.relpath(path, root)
+            if _is_image(relative_path) and valid_user_name(_label_for(relative_path)):
+                items.append((_label_for(relative_path), relative_path, lambda p=path: open(p, "rb").read()))
+    return items
+
+
+def collect_from_zip(zip_file, max_image_bytes=BULK_MAX_IMAGE_BYTES):
+    """Same as collect_from_directory for a zip archive (path or file object).
+
+    Members larger than ``max_image_bytes`` uncompressed are never read
+    (reading them fails that image), so a zip bomb can't exhaust memory.
+    """
+    archive = zipfile.ZipFile(zip_file)
+    members = [m for m in archive.infolist() if not m.is_dir() and _is_image(m.filename)]
+
+    def read(member):
+        if member.file_size > max_image_bytes:
+            raise ValueError(f"Image larger than {max_image_bytes} bytes")
+        return archive.read(member)
+
+    # A zip of a single folder ("staff/alice/1.jpg") is labelled as if that folder were the root
+    prefix = ""
+    tops = {m.filename.split("/", 1)[0] for m in members}
+    if len(tops) == 1 and all("/" in m.filename for m in members):
+        prefix = tops.pop() + "/"
+
+    return [(_label_for(m.filename[len(prefix):]), m.filename, lambda m=m: read(m)) for m in members
+            if valid_user_name(_label_for(m.filename[len(prefix):]))]
+
+
+def enroll(items, role, pool, max_frame_width, timeout, max_exemplars=5, concurrency=None):
+    """Embed labelled images in parallel and build one template per identity.
+
+    ``items`` come from collect_from_directory/collect_from_zip. Images are
+    decoded and face-gated in worker threads and embedded through ``pool``,
+    whose dispatcher batches the concurrent requests. By default at most
+    ``pool.size`` images are in flight, so live logins sharing the pool keep
+    most of its capacity. Under eventlet, decoding and gating run in native
+    threads (``eventlet.tpool``) so they don't stall the hub. Returns
+    ``(records, report)``: the user records ready to store (nothing is written
+    here), and a per-image / per-identity success and failure report.
+    """
+    if concurrency is None:
+        concurrency = max(1, pool.size)
+
+    def prepare(image_bytes):
+        return face_for_embedding(decode_image(image_bytes, max_frame_width))
+
+    def embed_one(item):
+        name, path, read = item
+        try:
+            if _is_green():
+                from eventlet import tpool
+                face, detector_backend = tpool.execute(prepare, read())
+            else:
+                face, detector_backend = prepare(read())
+            if face is None:
+                return name, path, None, "Face not detected"
+            for _ in range(BUSY_RETRIES):
+                try:
+                    embedding = pool.embed(face, timeout, detector_backend)
+                    break
+                except InferenceBusy:
+                    time.sleep(0.05)
+            else:
+                return name, path, None, "Server busy"
+            if embedding is None:
+                return name, path, None, "Face not detected"
+            return name, path, embedding, None
+        except Exception as e:
+            return name, path, None, str(e) or type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(embed_one, items))
+
+    embeddings_by_name = {}
+    image_report = []
+    for name, path, embedding, error in results:
+        image_report.append({"file": path, "name": name, "status": "failed" if error else "ok", **({"error": error} if error else {})})
+        if embedding is not None:
+            embeddings_by_name.setdefault(name, []).append(embedding)
+
+    now = datetime.now()
+    tag = model_tag()
+    records = []
+    identity_report = []
+    for name in sorted({name for name, _, _ in items}):
+        embeddings = embeddings_by_name.get(name)
+        if not embeddings:
+            identity_report.append({"name": name, "status": "failed", "images_used": 0,
+                                    "error": "No usable face in any image"})
+            continue
+        records.append({
+            "name": name,
+            "role": role,
+            "registration_date": now.strftime("%d-%m-%Y"),
+            "registration_time": now.strftime("%H:%M:%S"),
+            "model": tag,
+            **new_template(embeddings, max_exemplars),
+        })
+        identity_report.append({"name": name, "status": "ok", "images_used": len(embeddings)})
+
+    report = {
+        "registered": len(records),
+        "failed_identities": sum(1 for r in identity_report if r["status"] == "failed"),
+        "failed_images": sum(1 for r in image_report if r["status"] == "failed"),
+        "identities": identity_report,
+        "images": image_report,
+    }
+    return records, report
+
+
+def save_enrolled(records, report):
+    """Store the records of enroll() in DATA_FILE and the gallery, as /register would.
+
+    Names that are already registered get the new images folded into their
+    template, the others are added, all in one write. Updates ``report``
+    (``registered`` / ``updated`` counts, ``existing`` per identity).
+    """
+    updated = add_or_merge_templates(records)
+    for identity in report["identities"]:
+        if identity["name"] in updated:
+            identity["existing"] = True
+    report["registered"] = len(records) - len(updated)
+    report["updated"] = len(updated)
@@ -0,0 +1,130 @@
+# helpers/consensus.py
+
+from collections import deque, defaultdict
+import cv2
+import numpy as np
+
+ACCEPT = "accept"
+REJECT = "reject"
+PENDING = "pending"
+STILL = "still"  # Only repeats of frames already seen: no new evidence to decide on
+
+
+def motion_signature(image, size=32):
+    """Downscaled, contrast-normalised grayscale thumbnail of a frame, for frame-to-frame cues."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return (small - small.mean()) / (small.std() + 1e-6)
+
+
+class LivenessCues:
+    """Cheap motion and blink cues from consecutive frames of one session.
+
+    Between two frames, on ``size``x``size`` thumbnails:
+
+    - motion: mean absolute change. A live face is never perfectly still,
+      a replayed photo or screenshot is; changes above ``max_motion`` mean a
+      different scene and don't count.
+    - blink: the eye band of the face crop changes ``blink_ratio`` times
+      more than the rest of the face.
+
+    Heuristics against replaying one still image, not a presentation-attack
+    detector.
+    """
+    EYE_BAND = (0.2, 0.5)  # Rows of a face crop holding the eyes, as fractions of its height
+
+    def __init__(self, min_motion, max_motion, blink_ratio, size=32):
+        self.min_motion = min_motion
+        self.max_motion = max_motion
+        self.blink_ratio = blink_ratio
+        self.size = size
+        self.motion_frames = 0
+        self.blinks = 0
+        self._previous = None
+
+    def observe(self, image):
+        signature = motion_signature(image, self.size)
+        previous, self._previous = self._previous, signature
+        if previous is None:
+            return
+        change = np.abs(signature - previous)
+        if not self.min_motion <= float(change.mean()) <= self.max_motion:
+            return
+        self.motion_frames += 1
+        top, bottom = (int(f * self.size) for f in self.EYE_BAND)
+        eyes = float(change[top:bottom].mean())
+        rest = float(np.concatenate([change[:top], change[bottom:]]).mean())
+        if eyes > self.blink_ratio * rest:
+            self.blinks += 1
+
+    def live(self, require_blink=False):
+        return self.motion_frames > 0 and (self.blinks > 0 or not require_blink)
+
+
+class ConsensusWindow:
+    """Login decision over the recent embedded frames of one session.
+
+    Every embedded frame adds its best match to a sliding window. The
+    session is accepted once enough frames in the window agree on the same
+    user under ``threshold``: ``min_frames`` when their mean distance is
+    under ``confident_distance``, otherwise a majority of the full window.
+    It is rejected early when the last ``min_frames`` frames were all
+    clearly no match (``reject_margin`` over the threshold) or when the
+    frames left in the ``max_frames`` budget can't produce an accept.
+    Repeats of a frame already seen (e.g. a user holding very still) add no
+    evidence and don't use up the budget; after ``max_repeats`` of them in a
+    row the attempt ends with STILL, so the client can ask the user to move
+    instead of answering "Unknown".
+    """
+
+    def __init__(self, threshold, window=5, min_frames=2, max_frames=8, confident_distance=6.0, reject_margin=3.0,
+                 max_repeats=None):
+        self.threshold = threshold
+        self.window = window
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.confident_distance = confident_distance
+        self.reject_margin = reject_margin
+        self.max_repeats = max_frames if max_repeats is None else max_repeats
+        self.frames = 0  # Frames counted against max_frames
+        self.repeats = 0  # Repeated frames since the last new one
+        self._frames = deque(maxlen=window)  # (user, distance, embedding)
+
+    def add(self, user, distance, embedding):
+        self.frames += 1
+        self.repeats = 0
+        self._frames.append((user, distance, embedding))
+
+    def repeat(self):
+        """Count a repeated frame (e.g. a frame cache hit) without adding its match again."""
+        self.repeats += 1
+
+    def decide(self):
+        """Return ``(decision, frame)``; ``frame`` is the agreeing ``(user, distance, embedding)``
+        with the smallest distance, or None when nothing agrees yet."""
+        votes = defaultdict(list)
+        for frame in self._frames:
+            user, distance, _ = frame
+            if user is not None and distance < self.threshold:
+                votes[user.get("name")].append(frame)
+        agreeing = max(votes.values(), key=lambda frames: (len(frames), -_mean_distance(frames)), default=[])
+        best = min(agreeing, key=lambda frame: frame[1]) if agreeing else None
+
+        majority = self.window // 2 + 1
+        if len(agreeing) >= self.min_frames and (_mean_distance(agreeing) < self.confident_distance
+                                                 or len(agreeing) >= majority):
+            return ACCEPT, best
+
+        remaining = self.max_frames - self.frames
+        recent = list(self._frames)[-self.min_frames:]
+        clear_misses = len(recent) == self.min_frames and all(
+            user is None or distance > self.threshold + self.reject_margin for user, distance, _ in recent)
+        if remaining <= 0 or len(agreeing) + remaining < self.min_frames or clear_misses:
+            return REJECT, best
+        if self.repeats >= self.max_repeats:
+            return STILL, best
+        return PENDING, best
+
+
+def _mean_distance(frames):
+    return sum(distance for _, distance, _ in frames) / len(frames)
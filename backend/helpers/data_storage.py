@@ -2,19 +2,156 @@
 
 import json
 import os
+import threading
+from helpers.embedding_store import open_store
+from helpers.file_lock import FileLock, atomic_write
+from helpers.group_commit import GroupCommit
 
 def load_data(file_path):
-    """Load existing embeddings from data.json"""
+    """Load existing embeddings from data.json (or its binary store, if migrated)"""
+    store = open_store(file_path)
+    if store is not None:
+        return store.records()
     try:
         with open(file_path, "r") as f:
             return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+    except FileNotFoundError:
         return []
+    except json.JSONDecodeError as e:
+        # Never read a damaged file as "no users": the next save would wipe every user
+        raise ValueError(f"{file_path} is corrupt ({str(e)}); restore it from a backup") from e
+
+def load_metadata(file_path, fields):
+    """Only ``fields`` of every stored user, as load_data() would list them.
+
+    The binary store answers from its sidecar metadata without reading any
+    embedding; data.json has to be parsed whole.
+    """
+    store = open_store(file_path)
+    if store is not None:
+        return store.metadata(fields)
+    return [{k: user[k] for k in fields if k in user} for user in load_data(file_path)]
+
+def data_version(file_path):
+    """Changes whenever the stored users may have changed (compare, don't order)."""
+    store = open_store(file_path)
+    if store is not None:
+        return store.version
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
 def save_data(file_path, data):
-    """Save embeddings to data.json properly"""
+    """Save embeddings to data.json properly (or rewrite its binary store)"""
     try:
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=4)  # Pretty format JSON
+        store = open_store(file_path)
+        if store is not None:
+            store.rewrite(data)
+            return
+        with _json_lock(file_path):
+            _write_json(file_path, data)
     except Exception as e:
         print(f"Error saving data: {str(e)}")
+        raise
+
+def append_user(file_path, user):
+    """Add one user record. Appends to the binary store instead of rewriting it."""
+    store = open_store(file_path)
+    if store is not None:
+        store.append(user)
+        return
+    _json_writes(file_path).submit(("append", [user]))
+
+def append_users(file_path, users):
+    """Add several user records in one write (one transaction with the binary store)."""
+    store = open_store(file_path)
+    if store is not None:
+        store.append_many(users)
+        return
+    _json_writes(file_path).submit(("append", users))
+
+def upsert_users(file_path, users):
+    """Add several user records in one write, replacing every record of their names."""
+    store = open_store(file_path)
+    if store is not None:
+        store.upsert_many(users)
+        return
+    _json_writes(file_path).submit(("upsert", users))
+
+def delete_user(file_path, name):
+    """Remove every record for ``name``. Returns the number of records removed."""
+    store = open_store(file_path)
+    if store is not None:
+        return store.delete(name)
+    return _json_writes(file_path).submit(("delete", name))
+
+def replace_user(file_path, user):
+    """Replace every record named ``user["name"]`` with ``user`` (template updates)."""
+    store = open_store(file_path)
+    if store is not None:
+        store.replace(user["name"], user)
+        return
+    _json_writes(file_path).submit(("replace", user))
+
+def storage_lock(file_path):
+    """The lock every write to ``file_path`` takes (binary store or data.json), across processes.
+
+    Hold it to read and rewrite the users without any other write landing in between.
+    """
+    store = open_store(file_path)
+    if store is not None:
+        return store.lock
+    return _json_lock(file_path)
+
+
+# --- data.json writes ---
+# Every change is a load-modify-save under a file lock (held across processes),
+# and concurrent changes are group-committed into one atomic rewrite.
+
+_json_locks = {}
+_json_committers = {}
+_json_registry_lock = threading.Lock()
+
+def _json_lock(file_path):
+    with _json_registry_lock:
+        if file_path not in _json_locks:
+            _json_locks[file_path] = FileLock(file_path + ".lock")
+        return _json_locks[file_path]
+
+def _json_writes(file_path):
+    with _json_registry_lock:
+        if file_path not in _json_committers:
+            _json_committers[file_path] = GroupCommit(lambda ops: _commit_json(file_path, ops))
+        return _json_committers[file_path]
+
+def _commit_json(file_path, ops):
+    with _json_lock(file_path):
+        stored_data = load_data(file_path)
+        results = []
+        changed = False
+        for op in ops:
+            if op[0] in ("append", "upsert"):
+                if op[0] == "upsert":
+                    names = {user.get('name') for user in op[1]}
+                    stored_data = [user for user in stored_data if user.get('name') not in names]
+                stored_data.extend(op[1])
+                results.append(None)
+                changed = True
+                continue
+            name = op[1] if op[0] == "delete" else op[1]["name"]
+            kept = [user for user in stored_data if user.get('name') != name]
+            removed = len(stored_data) - len(kept)
+            if op[0] == "replace":
+                kept.append(op[1])
+            stored_data = kept
+            results.append(removed if op[0] == "delete" else None)
+            changed = changed or removed or op[0] == "replace"
+        if changed:
+            _write_json(file_path, stored_data)
+        return results
+
+def _write_json(file_path, data):
+    # Temp file + fsync + rename: a crash leaves the old file or the new one, never a truncated one
+    atomic_write(file_path, json.dumps(data, indent=4).encode())  # Pretty format JSON
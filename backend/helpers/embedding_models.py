@@ -0,0 +1,149 @@
+# helpers/embedding_models.py
+
+import os
+import threading
+import numpy as np
+import cv2
+
+# Runtimes are imported when a model is created, so only the configured one is loaded
+BACKENDS = ("deepface", "onnx", "tflite")
+
+
+class KerasFacenet:
+    """DeepFace's Facenet on TensorFlow/Keras (the reference implementation)."""
+    name = "deepface"
+
+    def __init__(self):
+        from deepface import DeepFace
+        from helpers.face_recognition import MODEL_NAME
+        model = DeepFace.build_model(MODEL_NAME)  # Cached by DeepFace after the first call
+        self.input_shape = model.input_shape
+        self.model = model.model  # The tf.keras model (exported by scripts/export_facenet.py)
+
+    def predict(self, batch):
+        return self.model(batch, training=False).numpy()
+
+
+class OnnxFacenet:
+    """Facenet exported to ONNX (scripts/export_facenet.py), run by ONNX Runtime on CPU."""
+    name = "onnx"
+
+    def __init__(self, model_file, threads=0):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError('ONNX Runtime is not installed: pip install onnxruntime')
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self._session = onnxruntime.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        model_input = self._session.get_inputs()[0]
+        self._input = model_input.name
+        self.input_shape = tuple(model_input.shape[1:3])
+
+    def predict(self, batch):
+        return self._session.run(None, {self._input: batch.astype(np.float32, copy=False)})[0]
+
+
+class TFLiteFacenet:
+    """Facenet converted to TensorFlow Lite (scripts/export_facenet.py).
+
+    Uses the small ``tflite_runtime`` package when installed, otherwise the
+    interpreter bundled with TensorFlow. Models with integer inputs/outputs
+    are (de)quantized here, so callers always see float32.
+    """
+    name = "tflite"
+
+    def __init__(self, model_file, threads=0):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError:
+                raise RuntimeError('No TFLite interpreter installed: pip install tflite-runtime')
+        self._interpreter = Interpreter(model_path=model_file, num_threads=threads or None)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self.input_shape = tuple(int(n) for n in self._input["shape"][1:3])
+        self._batch = int(self._input["shape"][0])
+        # The interpreter is not thread-safe and the input tensor is resized per batch
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        with self._lock:
+            if len(batch) != self._batch:
+                self._interpreter.resize_tensor_input(self._input["index"], [len(batch), *batch.shape[1:]])
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+                self._batch = len(batch)
+            self._interpreter.set_tensor(self._input["index"], _quantize(batch, self._input))
+            self._interpreter.invoke()
+            return _dequantize(self._interpreter.get_tensor(self._output["index"]), self._output)
+
+
+def _quantize(batch, details):
+    if details["dtype"] == np.float32:
+        return batch.astype(np.float32, copy=False)
+    scale, zero_point = details["quantization"]
+    info = np.iinfo(details["dtype"])
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(details["dtype"])
+
+
+def _dequantize(output, details):
+    if output.dtype == np.float32:
+        return output
+    scale, zero_point = details["quantization"]
+    return (output.astype(np.float32) - zero_point) * scale
+
+
+def create_embedding_model(backend, model_file=None, threads=0):
+    """Build the Facenet runtime for ``backend`` ("deepface", "onnx" or "tflite")."""
+    if backend == "deepface":
+        return KerasFacenet()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    if not model_file or not os.path.exists(model_file):
+        raise RuntimeError(f"Exported {backend} model not found at {model_file} "
+                           f"(create it with scripts/export_facenet.py --format {backend})")
+    if backend == "onnx":
+        return OnnxFacenet(model_file, threads)
+    return TFLiteFacenet(model_file, threads)
+
+
+def preprocess_face(image, target_size):
+    """DeepFace's preprocessing of an already cropped BGR face, without importing DeepFace.
+
+    Same steps as ``detection.extract_faces(detector_backend="skip")``
+    followed by ``preprocessing.resize_image``: scale to [0, 1], resize to
+    fit ``target_size`` (height, width) keeping the aspect ratio and pad
+    with black. Returns a float32 batch of one.
+    """
+    image = image / 255
+    factor = min(target_size[0] / image.shape[0], target_size[1] / image.shape[1])
+    image = cv2.resize(image, (int(image.shape[1] * factor), int(image.shape[0] * factor)))
+    diff_0 = target_size[0] - image.shape[0]
+    diff_1 = target_size[1] - image.shape[1]
+    image = np.pad(image, ((diff_0 // 2, diff_0 - diff_0 // 2), (diff_1 // 2, diff_1 - diff_1 // 2), (0, 0)),
+                   "constant")
+    if image.shape[0:2] != tuple(target_size):
+        image = cv2.resize(image, (target_size[1], target_size[0]))
+    return image.astype(np.float32)[np.newaxis]
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Return the Facenet runtime selected by EMBEDDING_BACKEND in config.py, created once per process."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            from config import EMBEDDING_BACKEND, EMBEDDING_THREADS, ONNX_MODEL_FILE, TFLITE_MODEL_FILE
+            model_file = {"onnx": ONNX_MODEL_FILE, "tflite": TFLITE_MODEL_FILE}.get(EMBEDDING_BACKEND)
+            _model = create_embedding_model(EMBEDDING_BACKEND, model_file, EMBEDDING_THREADS)
+        return _model
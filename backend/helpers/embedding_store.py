@@ -0,0 +1,514 @@
+# helpers/embedding_store.py
+
+import base64
+import json
+import os
+import threading
+import numpy as np
+from helpers.file_lock import FileLock, VersionCounter, atomic_write
+from helpers.group_commit import GroupCommit
+
+EMBEDDING_DIM = 128  # Facenet output size
+COMPACT_RATIO = 0.25  # Compact once this fraction of rows are tombstones
+COMPACT_MIN_ROWS = 64  # ...and at least this many
+
+
+class EmbeddingStore:
+    """Binary replacement for data.json.
+
+    For a DATA_FILE of ``data.json`` the store lives next to it as:
+
+    - ``data.store.json``: tiny manifest naming the current generation
+    - ``data.<gen>.f32``: fixed-stride float32 rows, one embedding per row
+      (memory-mappable, append-only)
+    - ``data.<gen>.jsonl``: one metadata line per row ``{"row": i, "name": ...}``
+      (or ``{"batch": [...]}`` for a bulk append) and one tombstone line
+      ``{"deleted": i, "name": ...}`` per deletion. A template update writes its new row
+      with ``"replaces": [old rows]`` so both take effect together (so can
+      the items of a batch, for bulk re-registration). Template
+      ``exemplars`` are kept in the metadata as base64 float32.
+
+    Registration appends a row and a metadata line; deletion appends a
+    tombstone. Compaction (and full rewrites) write a new generation and then
+    atomically replace the manifest, so a crash never leaves a mixed state.
+
+    Every write is appended and fsynced before it is acknowledged, and
+    concurrent writes (a burst of registrations, template updates) are
+    group-committed: one append and one fsync per file for all of them. The
+    sidecar is the store's write-ahead journal: it is replayed on open and a
+    torn last line from a crash is dropped.
+
+    Several processes can share a store: every operation holds
+    ``data.lock`` (flock) and first catches up with whatever the others
+    appended, and every write bumps the counter in ``data.version`` so
+    readers notice changes without touching the other files.
+    """
+
+    def __init__(self, file_path, dim=EMBEDDING_DIM):
+        self.root = os.path.splitext(file_path)[0]
+        self.dim = dim
+        self.stride = dim * 4
+        self.manifest_path = self.root + ".store.json"
+        self._lock = FileLock(self.root + ".lock")
+        self._version = VersionCounter(self.root + ".version")
+        self._generation = None
+        self._meta = None  # row -> metadata for live rows
+        self._meta_offset = 0  # Bytes of the sidecar already applied to _meta
+        self._rows = 0  # rows in the .f32 file
+        self._tombstones = 0
+        self._writes = GroupCommit(self._commit_group)  # Concurrent writes share one fsync
+        # Version this process's gallery reflects (see snapshot()); None until loaded
+        self.synced_version = None
+        # (generation, sidecar offset) the gallery reflects, for catch_up(); None when it can't tell
+        self._synced_cursor = None
+
+    # --- Paths / manifest ---
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def _paths(self, generation):
+        return f"{self.root}.{generation}.f32", f"{self.root}.{generation}.jsonl"
+
+    def _read_manifest(self):
+        with open(self.manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("dim") != self.dim:
+            raise ValueError(f"Store dimension {manifest.get('dim')} does not match {self.dim}")
+        return manifest["generation"]
+
+    def _write_manifest(self, generation):
+        atomic_write(self.manifest_path, json.dumps({"generation": generation, "dim": self.dim}).encode())
+
+    @property
+    def lock(self):
+        """Cross-process lock held by every read and write of the store (re-entrant)."""
+        return self._lock
+
+    @property
+    def version(self):
+        """Shared change counter, bumped by every write from any process."""
+        return self._version.value
+
+    def _committed(self, applied_locally=True):
+        """Publish a write to other processes (caller holds the lock).
+
+        ``applied_locally`` means the caller applies the same change to this
+        process's gallery itself, so it stays in sync without a reload, as long
+        as it was in sync before.
+        """
+        in_sync = self.synced_version == self._version.value
+        version = self._version.bump()
+        if in_sync and applied_locally:
+            self.synced_version = version
+            self._synced_cursor = (self._generation, self._meta_offset)
+        elif applied_locally:
+            # Applied ahead of changes the gallery hasn't caught up with: only a snapshot can reconcile
+            self._synced_cursor = None
+
+    # --- Loading ---
+
+    def _ensure_open(self):
+        """Catch up with the files on disk (caller holds the lock).
+
+        Another process may have appended rows and sidecar lines or switched
+        to a new generation since this process last looked; only what is new
+        is read.
+        """
+        generation = self._read_manifest()
+        if generation != self._generation or self._meta is None:
+            self._meta, self._meta_offset, self._tombstones = {}, 0, 0
+            self._generation = generation
+        emb_path, meta_path = self._paths(generation)
+        self._rows = _repair_rows(emb_path, self.stride)
+        self._meta_offset, tombstones = _replay_meta(meta_path, self._rows, self._meta, self._meta_offset)
+        self._tombstones += tombstones
+
+    def read(self):
+        """Return ``(embeddings, users)`` for the live rows.
+
+        ``embeddings`` is a float32 array copied out of a read-only memory map,
+        ``users`` the matching metadata dicts (without embeddings).
+        """
+        with self._lock:
+            self._ensure_open()
+            rows = sorted(self._meta)
+            users = [_decode_meta(self._meta[row], self.dim) for row in rows]
+            if not rows:
+                return np.empty((0, self.dim), dtype=np.float32), users
+            emb_path, _ = self._paths(self._generation)
+            matrix = np.memmap(emb_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+            embeddings = np.array(matrix[rows])
+            del matrix
+            return embeddings, users
+
+    def snapshot(self):
+        """Shared view of the store for the gallery: ``(matrix, users)``.
+
+        ``matrix`` is a read-only memory map of every row of the current
+        generation, so all processes serving this store share one copy of the
+        embeddings in the page cache. ``users[i]`` is the metadata of row i,
+        or None for a deleted row. Marks this process as in sync with the
+        current version.
+        """
+        with self._lock:
+            self._ensure_open()
+            users = [None] * self._rows
+            for row, meta in self._meta.items():
+                users[row] = _decode_meta(meta, self.dim)
+            if not self._rows:
+                matrix = np.empty((0, self.dim), dtype=np.float32)
+            else:
+                emb_path, _ = self._paths(self._generation)
+                matrix = np.memmap(emb_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+            self.synced_version = self._version.value
+            self._synced_cursor = (self._generation, self._meta_offset)
+            return matrix, users
+
+    def catch_up(self):
+        """Changes other processes made since this process's gallery was last in sync.
+
+        Returns a list of ``("add", records)``, ``("replace", record)`` and
+        ``("remove", name)`` in commit order (records with their
+        ``embedding``), read from the sidecar lines appended since, and marks
+        the gallery in sync. Returns None when only snapshot() can bring it
+        up to date: another generation (compaction, rewrite), or this
+        process wrote before catching up.
+        """
+        with self._lock:
+            version = self._version.value
+            if self.synced_version == version:
+                return []
+            cursor = self._synced_cursor
+            self._ensure_open()
+            if cursor is None or cursor[0] != self._generation:
+                return None
+            emb_path, meta_path = self._paths(self._generation)
+            with open(meta_path, "rb") as f:
+                f.seek(cursor[1])
+                payload = f.read(self._meta_offset - cursor[1])
+
+            changes = []
+            matrix = np.memmap(emb_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim)) if self._rows else None
+            for line in payload.splitlines():
+                entry = json.loads(line)
+                if "deleted" in entry:
+                    if "name" not in entry:
+                        return None  # Tombstone written before they named their user
+                    changes.append(("remove", entry["name"]))
+                    continue
+                added = []
+                for item in entry["batch"] if "batch" in entry else [entry]:
+                    if item["row"] >= self._rows:
+                        return None
+                    meta = {k: v for k, v in item.items() if k not in ("row", "replaces")}
+                    record = dict(_decode_meta(meta, self.dim), embedding=np.array(matrix[item["row"]]))
+                    if "replaces" in item:
+                        changes.append(("replace", record))
+                    else:
+                        added.append(record)
+                if added:
+                    changes.append(("add", added))
+            del matrix
+            self.synced_version = version
+            self._synced_cursor = (self._generation, self._meta_offset)
+            return changes
+
+    def metadata(self, fields):
+        """Only ``fields`` of every live row's metadata, in row order; reads no embeddings."""
+        with self._lock:
+            self._ensure_open()
+            return [{k: meta[k] for k in fields if k in meta} for _, meta in sorted(self._meta.items())]
+
+    def records(self):
+        """Return the live rows as data.json-style dicts (compatibility path)."""
+        embeddings, users = self.read()
+        records = []
+        for user, row in zip(users, embeddings):
+            if "exemplars" in user:
+                user["exemplars"] = user["exemplars"].tolist()
+            records.append(dict(user, embedding=row.tolist()))
+        return records
+
+    # --- Writes ---
+
+    def append(self, record):
+        """Append one user record (with its ``embedding``)."""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Append several user records as one transaction.
+
+        All metadata goes in a single sidecar line, so a crash mid-write
+        drops the whole batch rather than leaving part of it.
+        """
+        if records:
+            # Converted here, so a bad record fails its own call and not the whole group
+            rows_bytes = np.asarray([r["embedding"] for r in records], dtype=np.float32).reshape(-1, self.dim).tobytes()
+            self._writes.submit(("append", rows_bytes, [_encode_meta(r) for r in records]))
+
+    def upsert_many(self, records):
+        """Write several user records as one transaction, replacing every row of their names.
+
+        Like append_many(), all of it goes in a single sidecar line: the new
+        rows and the tombstones of the rows they replace take effect together.
+        """
+        if records:
+            rows_bytes = np.asarray([r["embedding"] for r in records], dtype=np.float32).reshape(-1, self.dim).tobytes()
+            self._writes.submit(("upsert", rows_bytes, [_encode_meta(r) for r in records]))
+
+    def delete(self, name):
+        """Tombstone every row registered under ``name``. Returns the number removed."""
+        return self._writes.submit(("delete", name))
+
+    def replace(self, name, record):
+        """Replace every row of ``name`` with ``record`` (a template update).
+
+        The new row and the tombstones for the old ones share one sidecar
+        line, so a crash leaves either the old template or the new one.
+        """
+        row_bytes = np.asarray(record["embedding"], dtype=np.float32).reshape(self.dim).tobytes()
+        self._writes.submit(("replace", name, row_bytes, _encode_meta(record)))
+
+    def _commit_group(self, ops):
+        """Apply a group of writes (see GroupCommit) with one append and fsync per file.
+
+        Each op still gets its own sidecar line(s), in order, so a crash
+        mid-write keeps a prefix of the group; no op is acknowledged before
+        both appends are on disk. Returns the result of each op.
+        """
+        rows = []
+        lines = []
+        with self._lock:
+            self._ensure_open()
+            emb_path, meta_path = self._paths(self._generation)
+            try:
+                results = [self._apply(op, rows, lines) for op in ops]
+                # Embeddings first: metadata is only ever written for complete rows
+                if rows:
+                    _append(emb_path, b"".join(rows))
+                payload = "".join(lines).encode()
+                if payload:
+                    _append(meta_path, payload)
+                    self._meta_offset += len(payload)
+            except BaseException:
+                # Applied in memory but maybe not on disk: re-read everything on next use
+                self._meta = None
+                raise
+            if payload:
+                self._committed()
+
+            if self._tombstones >= max(COMPACT_MIN_ROWS, COMPACT_RATIO * self._rows):
+                self.compact()
+        return results
+
+    def _apply(self, op, rows, lines):
+        """Apply one write to the in-memory state, adding its row bytes and sidecar lines."""
+        kind = op[0]
+        if kind == "upsert":
+            _, rows_bytes, metas = op
+            names = {meta.get("name") for meta in metas}
+            replaced = {}
+            for row, meta in list(self._meta.items()):
+                if meta.get("name") in names:
+                    replaced.setdefault(meta.get("name"), []).append(row)
+                    del self._meta[row]
+            self._tombstones += sum(len(old_rows) for old_rows in replaced.values())
+            first_row = self._rows
+            rows.append(rows_bytes)
+            self._rows += len(metas)
+            batch = []
+            for i, meta in enumerate(metas):
+                item = dict(meta, row=first_row + i)
+                if meta.get("name") in replaced:
+                    item["replaces"] = replaced[meta.get("name")]
+                batch.append(item)
+                self._meta[first_row + i] = meta
+            lines.append(json.dumps({"batch": batch}) + "\n")
+            return None
+        if kind == "append":
+            _, rows_bytes, metas = op
+            first_row = self._rows
+            rows.append(rows_bytes)
+            self._rows += len(metas)
+            if len(metas) == 1:
+                line = dict(metas[0], row=first_row)
+            else:
+                line = {"batch": [dict(meta, row=first_row + i) for i, meta in enumerate(metas)]}
+            lines.append(json.dumps(line) + "\n")
+            for i, meta in enumerate(metas):
+                self._meta[first_row + i] = meta
+            return None
+
+        name = op[1]
+        old_rows = [row for row, meta in self._meta.items() if meta.get("name") == name]
+        for row in old_rows:
+            del self._meta[row]
+        self._tombstones += len(old_rows)
+        if kind == "delete":
+            lines.extend(json.dumps({"deleted": row, "name": name}) + "\n" for row in old_rows)
+            return len(old_rows)
+
+        _, _, row_bytes, meta = op
+        new_row = self._rows
+        rows.append(row_bytes)
+        self._rows += 1
+        lines.append(json.dumps(dict(meta, row=new_row, replaces=old_rows)) + "\n")
+        self._meta[new_row] = meta
+        return None
+
+    def compact(self):
+        """Rewrite the live rows into a new generation, dropping tombstones."""
+        with self._lock:
+            embeddings, users = self.read()
+            self._write_generation(embeddings, users)
+            self._committed()  # Same contents: a gallery that was in sync stays in sync
+
+    def rewrite(self, records):
+        """Replace the whole store with ``records`` (data.json-style dicts)."""
+        embeddings = np.asarray([r["embedding"] for r in records], dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            self._write_generation(embeddings, records)
+            self._committed(applied_locally=False)
+
+    def _write_generation(self, embeddings, users):
+        old_generation = self._read_manifest() if self.exists() else None
+        generation = (old_generation or 0) + 1
+        emb_path, meta_path = self._paths(generation)
+
+        atomic_write(emb_path, np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        metas = [_encode_meta(user) for user in users]
+        lines = "".join(json.dumps(dict(meta, row=i)) + "\n" for i, meta in enumerate(metas)).encode()
+        atomic_write(meta_path, lines)
+        self._write_manifest(generation)
+
+        self._generation = generation
+        self._rows = len(metas)
+        self._meta = dict(enumerate(metas))
+        self._meta_offset = len(lines)
+        self._tombstones = 0
+
+        if old_generation is not None:
+            for path in self._paths(old_generation):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _encode_meta(record):
+    """Sidecar form of a record: no embedding, exemplars as base64 float32."""
+    meta = {k: v for k, v in record.items() if k != "embedding"}
+    if "exemplars" in meta:
+        exemplars = np.ascontiguousarray(meta["exemplars"], dtype=np.float32)
+        meta["exemplars"] = base64.b64encode(exemplars.tobytes()).decode("ascii")
+    return meta
+
+
+def _decode_meta(meta, dim):
+    user = dict(meta)
+    if "exemplars" in user:
+        user["exemplars"] = np.frombuffer(base64.b64decode(user["exemplars"]), dtype=np.float32).reshape(-1, dim)
+    return user
+
+
+def _append(path, payload):
+    with open(path, "ab") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _repair_rows(emb_path, stride):
+    """Return the number of complete rows, trimming a torn trailing write."""
+    if not os.path.exists(emb_path):
+        open(emb_path, "wb").close()
+        return 0
+    size = os.path.getsize(emb_path)
+    if size % stride:
+        with open(emb_path, "r+b") as f:
+            f.truncate(size - size % stride)
+    return size // stride
+
+
+def _replay_meta(meta_path, rows, meta, offset=0):
+    """Apply the sidecar from byte ``offset`` on to ``meta`` (``{row: metadata}``).
+
+    Returns ``(new_offset, tombstones)``: how far the sidecar has been read
+    and how many rows the new lines deleted.
+    """
+    tombstones = 0
+    if not os.path.exists(meta_path):
+        open(meta_path, "wb").close()
+        return 0, tombstones
+
+    with open(meta_path, "rb") as f:
+        f.seek(offset)
+        payload = f.read()
+    if payload and not payload.endswith(b"\n"):
+        # Torn final line from a crash mid-append: drop it so later appends stay line-aligned
+        payload = payload[:payload.rfind(b"\n") + 1]
+        with open(meta_path, "r+b") as f:
+            f.truncate(offset + len(payload))
+
+    for line in payload.splitlines():
+        entry = json.loads(line)
+        if "deleted" in entry:
+            if meta.pop(entry["deleted"], None) is not None:
+                tombstones += 1
+            continue
+        for item in entry["batch"] if "batch" in entry else [entry]:
+            for row in item.pop("replaces", ()):
+                if meta.pop(row, None) is not None:
+                    tombstones += 1
+            row = item.pop("row")
+            if row < rows:
+                meta[row] = item
+    return offset + len(payload), tombstones
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(file_path):
+    """Return the shared store for ``file_path`` if one has been created, else None."""
+    with _stores_lock:
+        store = _stores.get(file_path)
+        if store is None:
+            store = EmbeddingStore(file_path)
+            if not store.exists():
+                return None
+            _stores[file_path] = store
+        return store
+
+
+def migrate_json_to_store(file_path):
+    """One-shot migration of a data.json file into the binary store.
+
+    The JSON file is kept as ``<file>.migrated`` for rollback. Returns the
+    number of migrated users, or None if there was nothing to migrate.
+    """
+    store = EmbeddingStore(file_path)
+    if store.exists():
+        return None
+
+    records = []
+    if os.path.exists(file_path):
+        with open(file_path, "r") as f:
+            records = json.load(f)
+
+    valid = []
+    for record in records:
+        embedding = record.get("embedding")
+        if isinstance(embedding, list) and len(embedding) == store.dim:
+            valid.append(record)
+        else:
+            print(f"Warning: Not migrating user {record.get('name', 'Unknown')} due to missing or invalid embedding.")
+
+    store.rewrite(valid)
+    if os.path.exists(file_path):
+        os.replace(file_path, file_path + ".migrated")
+    with _stores_lock:
+        _stores[file_path] = store
+    return len(valid)
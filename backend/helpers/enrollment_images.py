@@ -0,0 +1,89 @@
+# helpers/enrollment_images.py
+
+import hashlib
+import os
+import re
+import shutil
+import time
+from urllib.parse import quote, unquote
+from helpers.file_lock import atomic_write
+from config import RETAIN_ENROLLMENT_IMAGES, ENROLLMENT_IMAGE_DIR
+
+
+class EnrollmentImages:
+    """The original images users were registered with, kept to re-embed them later.
+
+    Embeddings from different models can't be compared, so when the model or
+    detector changes every user has to be embedded again
+    (scripts/reembed_gallery.py). Images are stored exactly as uploaded, one
+    directory per user (the name percent-encoded, dots included, so no name
+    can point outside ``root``), and never modified; a
+    user's image list therefore tells whether a re-embedded template is
+    still up to date.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _user_dir(self, name):
+        if not valid_user_name(name):
+            raise ValueError(f"Invalid user name: {name!r}")
+        user_dir = os.path.join(self.root, quote(name, safe="").replace(".", "%2E"))
+        root = os.path.realpath(self.root)
+        if os.path.dirname(os.path.realpath(user_dir)) != root:
+            raise ValueError(f"Invalid user name: {name!r}")
+        return user_dir
+
+    def save(self, name, image_bytes, extension=".jpg"):
+        """Store one image of ``name``; returns its file name."""
+        if not re.fullmatch(r"\.[A-Za-z0-9]{1,5}", extension or ""):
+            extension = ".jpg"
+        user_dir = self._user_dir(name)
+        os.makedirs(user_dir, exist_ok=True)
+        digest = hashlib.sha1(image_bytes).hexdigest()[:12]
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest}{extension.lower()}"
+        atomic_write(os.path.join(user_dir, filename), bytes(image_bytes))
+        return filename
+
+    def files(self, name):
+        """Sorted file names of the images of ``name`` (empty if none were kept)."""
+        try:
+            return sorted(f for f in os.listdir(self._user_dir(name)) if not f.endswith(".tmp"))
+        except FileNotFoundError:
+            return []
+
+    def items(self, name):
+        """``[(name, file, read_bytes)]`` for ``name``, as helpers/bulk_enrollment.enroll takes them."""
+        user_dir = self._user_dir(name)
+        return [(name, f, lambda p=os.path.join(user_dir, f): open(p, "rb").read()) for f in self.files(name)]
+
+    def names(self):
+        """Every user with kept images."""
+        try:
+            return sorted(unquote(d) for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+        except FileNotFoundError:
+            return []
+
+    def delete(self, name):
+        """Remove every image of ``name`` (the user was deleted)."""
+        if not valid_user_name(name):
+            return  # Never stored (see _user_dir)
+        shutil.rmtree(self._user_dir(name), ignore_errors=True)
+
+
+def valid_user_name(name):
+    """Names that can be stored: not empty, and not ``.`` or ``..``."""
+    return isinstance(name, str) and name.strip() not in ("", ".", "..")
+
+
+def get_enrollment_images():
+    """Return the image store for ENROLLMENT_IMAGE_DIR, or None when images are not kept."""
+    return EnrollmentImages(ENROLLMENT_IMAGE_DIR) if RETAIN_ENROLLMENT_IMAGES else None
+
+
+def retain_bulk_images(images, items, report):
+    """Keep the images a bulk enrollment ``report`` embedded successfully."""
+    used = {(r["name"], r["file"]) for r in report["images"] if r["status"] == "ok"}
+    for name, path, read in items:
+        if (name, path) in used:
+            images.save(name, read(), os.path.splitext(path)[1] or ".jpg")
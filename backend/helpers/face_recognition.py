@@ -1,16 +1,120 @@
 # helpers/face_recognition.py
 
-from deepface import DeepFace
+import hashlib
+import os
+import time
+import numpy as np
+from helpers.embedding_models import get_embedding_model, preprocess_face
 
-def extract_embedding(image):
+# DeepFace/TensorFlow are imported inside the functions below (see helpers/model_lifecycle.py);
+# Facenet itself runs on the EMBEDDING_BACKEND runtime (see helpers/embedding_models.py)
+MODEL_NAME = "Facenet"
+DETECTOR_BACKEND = "opencv"
+# Stored with every embedding (see model_tag()). Embeddings with different tags can't be compared:
+# after a change to the model, the face crops or the Facenet export, the gallery has to be
+# re-embedded with scripts/reembed_gallery.py. Bump MODEL_VERSION for preprocessing changes.
+MODEL_VERSION = 2
+LEGACY_MODEL_TAG = "Facenet/legacy"  # Records stored before tags existed, by whatever pipeline ran then
+
+def model_tag():
+    """Tag of the embeddings this process computes: model, crop pipeline, runtime and MODEL_VERSION.
+
+    The crop pipeline is "gate" (FACE_GATE_ENABLED: Haar crops embedded with
+    the "skip" detector) or DETECTOR_BACKEND. The runtime is "deepface", or
+    the exported backend with a digest of its model file, so a float32 and
+    a quantized export never share a tag. E.g. ``Facenet/gate/onnx-1f2e3d4c/2``.
+    """
+    from config import FACE_GATE_ENABLED, EMBEDDING_BACKEND, ONNX_MODEL_FILE, TFLITE_MODEL_FILE
+    crops = "gate" if FACE_GATE_ENABLED else DETECTOR_BACKEND
+    runtime = EMBEDDING_BACKEND
+    model_file = {"onnx": ONNX_MODEL_FILE, "tflite": TFLITE_MODEL_FILE}.get(EMBEDDING_BACKEND)
+    if model_file:
+        runtime += "-" + _file_digest(model_file)
+    return f"{MODEL_NAME}/{crops}/{runtime}/{MODEL_VERSION}"
+
+def model_tag_of(record):
+    """The model tag ``record``'s embedding was computed with."""
+    return record.get("model") or LEGACY_MODEL_TAG
+
+def comparable(tag, current):
+    """Whether embeddings tagged ``tag`` can be matched against ``current`` ones.
+
+    Untagged (legacy) Facenet records are still matched, as they always
+    were, until scripts/reembed_gallery.py replaces them.
+    """
+    return tag == current or (tag == LEGACY_MODEL_TAG and current.startswith(MODEL_NAME + "/"))
+
+_digests = {}
+
+def _file_digest(path):
     try:
-        results = DeepFace.represent(
-            img_path=image,
-            model_name="Facenet",
-            detector_backend="opencv",
-            enforce_detection=True
-        )
-        return results[0]["embedding"] if results else None
-    except Exception as e:
-        print(f"Embedding extraction failed: {str(e)}")
-        return None
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return "missing"
+    key = (path, stat.st_size, stat.st_mtime)
+    if key not in _digests:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()[:8]
+    return _digests[key]
+
+def extract_embedding(image, detector_backend=DETECTOR_BACKEND):
+    """Embedding of the first face in ``image`` (None when there is none).
+
+    Goes through extract_embeddings, so inline embedding (INFERENCE_WORKERS=0,
+    CLI tools) preprocesses exactly like the inference pool. DeepFace.represent
+    doesn't: with ``detector_backend="skip"`` it hands Facenet the crop in RGB.
+    """
+    return extract_embeddings([image], [detector_backend])[0]
+
+def extract_embeddings(images, detector_backends=None, timings=None):
+    """Batched extract_embedding: detect per image, then one Facenet forward pass.
+
+    Mirrors DeepFace.represent (first detected face, same preprocessing) but
+    runs the model once on the stacked crops, on the EMBEDDING_BACKEND runtime.
+    ``detector_backends`` gives the backend per image ("skip" for crops that
+    already passed the face gate). Returns one embedding (or None when no face
+    was found) per input image. If ``timings`` is a dict, the seconds spent in
+    "detection" and "facenet" are stored in it.
+    """
+    model = get_embedding_model()
+    target_size = model.input_shape
+    crops = []
+    owners = []
+    start = time.perf_counter()
+    for i, image in enumerate(images):
+        detector_backend = detector_backends[i] if detector_backends else DETECTOR_BACKEND
+        if detector_backend == "skip" and model.name != "deepface":
+            # Exported models never need DeepFace (or TensorFlow) for gated crops
+            crops.append(preprocess_face(image, target_size))
+            owners.append(i)
+            continue
+        from deepface.modules import detection, preprocessing
+        try:
+            faces = detection.extract_faces(
+                img_path=image,
+                detector_backend=detector_backend,
+                enforce_detection=True,
+                align=True
+            )
+        except Exception as e:
+            print(f"Embedding extraction failed: {str(e)}")
+            continue
+        face = faces[0]["face"][:, :, ::-1]  # RGB to BGR, as DeepFace.represent does
+        crops.append(preprocessing.resize_image(img=face, target_size=(target_size[1], target_size[0])))
+        owners.append(i)
+
+    detected = time.perf_counter()
+
+    embeddings = [None] * len(images)
+    if crops:
+        outputs = model.predict(np.concatenate(crops))
+        for i, embedding in zip(owners, outputs):
+            embeddings[i] = embedding.tolist()
+    if timings is not None:
+        timings["detection"] = detected - start
+        if crops:
+            timings["facenet"] = time.perf_counter() - detected
+    return embeddings
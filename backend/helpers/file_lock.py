@@ -0,0 +1,132 @@
+# helpers/file_lock.py
+
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies (single-process mode)
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive lock held across threads of this process and across processes.
+
+    Re-entrant within a thread. The cross-process part is ``flock`` on
+    ``path``; the file is reopened after a fork so parent and child don't
+    share one lock. When another process holds it, an eventlet server polls
+    for it between green sleeps, so the hub keeps serving other clients and
+    an ``eventlet.Timeout`` leaves the lock untaken.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        self._pid = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            if self._depth == 0:
+                if self._pid != os.getpid():
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    self._pid = os.getpid()
+                if fcntl is not None:
+                    _flock_exclusive(self._fd)
+            self._depth += 1
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+def _flock_exclusive(fd):
+    if not _is_green():
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    # Poll instead of blocking in a native thread: an eventlet.Timeout can then
+    # interrupt the wait without the lock being taken behind our back
+    import eventlet
+    delay = 0.001
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            eventlet.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+
+def _is_green():
+    try:
+        import eventlet.patcher
+    except ImportError:
+        return False
+    return eventlet.patcher.is_monkey_patched("thread")
+
+
+def atomic_write(path, payload):
+    """Replace ``path`` with ``payload`` so a crash leaves either the old or the new file.
+
+    Writes a temp file, fsyncs it, renames it over ``path`` and fsyncs the
+    directory so the rename itself is durable.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def fsync_directory(path):
+    if not hasattr(os, "O_DIRECTORY"):  # Windows: directories can't be opened
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class VersionCounter:
+    """64-bit counter in a small memory-mapped file, readable without a syscall.
+
+    Writers bump it while holding the matching FileLock; every process
+    mapping the file sees the new value immediately.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+
+    def _mapped(self):
+        if self._map is None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < 8:
+                    os.ftruncate(fd, 8)
+                self._map = mmap.mmap(fd, 8)
+            finally:
+                os.close(fd)
+        return self._map
+
+    @property
+    def value(self):
+        return struct.unpack_from("<Q", self._mapped())[0]
+
+    def bump(self):
+        value = self.value + 1
+        struct.pack_into("<Q", self._mapped(), 0, value)
+        return value
@@ -0,0 +1,90 @@
+# helpers/frame_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import FRAME_CACHE_SIZE, FRAME_CACHE_TTL, FRAME_CACHE_MAX_DISTANCE
+
+
+class FrameCache:
+    """Bounded LRU + TTL cache of embedding results, keyed by frame hash.
+
+    A lookup matches the same hash or, failing that, the closest cached hash
+    within ``max_distance`` bits, so near-identical frames (re-encoded, sensor
+    noise) share an entry.
+
+    An entry holds the embedding of a frame (None if no face was found) and
+    the match it produced, tagged with the gallery version at the time. When
+    the gallery has changed since, the embedding is still reused but the match
+    is dropped so the caller matches again against the current gallery.
+    """
+
+    def __init__(self, max_entries=256, ttl=10.0, max_distance=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # key -> (expires_at, embedding, gallery_version, match)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_matches = 0  # Hits whose match was dropped because the gallery changed
+        self.evictions = 0
+
+    def get(self, key, gallery_version):
+        """Return ``(embedding, match)`` for a cached frame, or None on a miss.
+
+        ``match`` is None when the cached one was computed against an older gallery.
+        """
+        with self._lock:
+            if key not in self._entries and self.max_distance:
+                key = self._nearest(key)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _, embedding, version, match = entry
+            if version != gallery_version:
+                self.stale_matches += 1
+                match = None
+            return embedding, match
+
+    def put(self, key, embedding, match, gallery_version):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, embedding, gallery_version, match)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _nearest(self, key):
+        """Closest cached key within max_distance bits of ``key`` (or ``key`` itself)."""
+        if not self._entries:
+            return key
+        query = np.frombuffer(key, dtype=np.uint8)
+        keys = list(self._entries)
+        stored = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), -1)
+        if stored.shape[1] != len(query):
+            return key
+        distances = np.unpackbits(stored ^ query, axis=1).sum(axis=1)
+        best = int(np.argmin(distances))
+        return keys[best] if distances[best] <= self.max_distance else key
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stale_matches": self.stale_matches,
+                "evictions": self.evictions,
+            }
+
+
+frame_cache = FrameCache(FRAME_CACHE_SIZE, FRAME_CACHE_TTL, FRAME_CACHE_MAX_DISTANCE)
@@ -1,28 +1,178 @@
 # helpers/frame_processing.py
 
+import threading
+from collections import Counter
 import numpy as np
 import cv2
 import base64
+from helpers.metrics import stage
 
-def process_frame(image_data, max_frame_width=640):
-    """Process image to resize and decode."""
-    try:
-        if isinstance(image_data, str) and image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
+# JPEG start-of-frame markers (carry the image size); C4/C8/CC are other segments
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
 
-        image_bytes = base64.b64decode(image_data)
-        image_array = np.frombuffer(image_bytes, dtype=np.uint8)
-        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-
-        if image is None:
-            raise ValueError("Invalid image data")
+def process_frame(image_data, max_frame_width=640):
+    """Process image to resize and decode.
 
-        # Resize if image width is too large
-        if image.shape[1] > max_frame_width:
-            scale = max_frame_width / image.shape[1]
-            image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+    ``image_data`` is either raw encoded bytes (binary Socket.IO attachment:
+    bytes, bytearray or memoryview) or a base64 string / data URL.
+    """
+    try:
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            # Binary attachment: decode straight from the received buffer
+            image_bytes = image_data
+        else:
+            with stage("base64_decode"):
+                if isinstance(image_data, str) and image_data.startswith('data:image'):
+                    image_data = image_data.split(',', 1)[1]
+                image_bytes = base64.b64decode(image_data)
 
-        return image
+        return decode_image(image_bytes, max_frame_width)
     except Exception as e:
         print(f"Frame processing error: {str(e)}")
         raise
+
+def decode_image(image_bytes, max_frame_width=640):
+    """Decode encoded image bytes to BGR, no wider than ``max_frame_width``.
+
+    Sources at least twice as wide as needed are decoded at 1/2, 1/4 or 1/8
+    scale (libjpeg does this during decoding), so full resolution is never
+    materialised just to be resized away.
+    """
+    with stage("image_decode"):
+        return _decode_image(image_bytes, max_frame_width)
+
+def _decode_image(image_bytes, max_frame_width):
+    image_array = np.frombuffer(image_bytes, dtype=np.uint8)  # Zero-copy view of the buffer
+
+    flags = cv2.IMREAD_COLOR
+    width = image_width(image_bytes)
+    if width:
+        for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                                (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if width // factor >= max_frame_width:
+                flags = reduced
+                break
+
+    image = cv2.imdecode(image_array, flags)
+    if image is None:
+        raise ValueError("Invalid image data")
+
+    # Resize if image width is too large
+    if image.shape[1] > max_frame_width:
+        scale = max_frame_width / image.shape[1]
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+
+    return image
+
+def image_width(image_bytes):
+    """Read the pixel width from a JPEG, PNG or WebP header without decoding (None if unknown)."""
+    data = memoryview(image_bytes).cast("B")
+    try:
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return int.from_bytes(data[16:20], "big")
+
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            chunk = data[12:16].tobytes()
+            if chunk == b"VP8 ":  # Lossy
+                return int.from_bytes(data[26:28], "little") & 0x3FFF
+            if chunk == b"VP8L":  # Lossless
+                return ((data[22] & 0x3F) << 8 | data[21]) + 1
+            if chunk == b"VP8X":  # Extended
+                return int.from_bytes(data[24:27], "little") + 1
+            return None
+
+        if data[:2] == b"\xff\xd8":
+            i = 2
+            while i + 9 <= len(data):
+                if data[i] != 0xFF:
+                    return None
+                marker = data[i + 1]
+                if marker == 0xFF:  # Fill byte
+                    i += 1
+                    continue
+                if marker in _JPEG_SOF_MARKERS:
+                    return int.from_bytes(data[i + 7:i + 9], "big")
+                i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    except IndexError:
+        pass
+    return None
+
+def frame_hash(image, hash_size=16):
+    """Perceptual (difference) hash of a decoded frame, as bytes.
+
+    The frame is shrunk to a ``hash_size`` x ``hash_size`` grayscale thumbnail
+    and each bit records whether a cell is brighter than its left neighbour,
+    so re-encoded or slightly noisy copies of a frame hash the same.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    # A small dead band keeps flat regions (walls, background) from flickering between 0 and 1
+    bits = (small[:, 1:] - small[:, :-1]) > 2
+    return np.packbits(bits).tobytes()
+
+_face_cascade = None
+_cascade_lock = threading.Lock()
+
+# How many frames the face gate let through ("passed") or rejected, by reason
+gate_counters = Counter()
+
+def _get_face_cascade():
+    global _face_cascade
+    with _cascade_lock:
+        if _face_cascade is None:
+            # Same cascade DeepFace's "opencv" detector uses
+            _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        return _face_cascade
+
+def gate_face(image, gate_width=320, min_face_size=60, min_sharpness=30.0):
+    """Cheap face-presence check to run before the embedding model.
+
+    Runs the Haar cascade on a downscaled grayscale copy, then checks the size
+    of the largest face and its sharpness (variance of the Laplacian). Returns
+    ``(crop, None)`` with the face cropped from ``image`` (ready for
+    ``detector_backend="skip"``), or ``(None, reason)`` where reason is
+    "no_face", "too_small" or "blurry".
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = 1.0
+    small = gray
+    if gray.shape[1] > gate_width:
+        scale = gate_width / gray.shape[1]
+        small = cv2.resize(gray, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    faces = _get_face_cascade().detectMultiScale(small, scaleFactor=1.1, minNeighbors=5, minSize=(20, 20))
+    if len(faces) == 0:
+        reason = "no_face"
+    else:
+        # Largest face, mapped back to full-resolution coordinates
+        x, y, w, h = (int(round(v / scale)) for v in max(faces, key=lambda f: f[2] * f[3]))
+        x, y = max(0, x), max(0, y)
+        if min(w, h) < min_face_size:
+            reason = "too_small"
+        elif cv2.Laplacian(gray[y:y + h, x:x + w], cv2.CV_64F).var() < min_sharpness:
+            reason = "blurry"
+        else:
+            gate_counters["passed"] += 1
+            return image[y:y + h, x:x + w], None
+
+    gate_counters[reason] += 1
+    return None, reason
+
+def face_for_embedding(image):
+    """Apply the face gate when FACE_GATE_ENABLED is set in config.py.
+
+    Returns ``(image, detector_backend)`` to hand to the embedding model, or
+    ``(None, None)`` when the gate rejected the frame.
+    """
+    from config import FACE_GATE_ENABLED, FACE_GATE_WIDTH, MIN_FACE_SIZE, MIN_FACE_SHARPNESS
+    from helpers.face_recognition import DETECTOR_BACKEND
+
+    if not FACE_GATE_ENABLED:
+        return image, DETECTOR_BACKEND
+    with stage("face_gate"):
+        face, _ = gate_face(image, FACE_GATE_WIDTH, MIN_FACE_SIZE, MIN_FACE_SHARPNESS)
+    if face is None:
+        return None, None
+    # The gate already found the face; don't let DeepFace detect it a second time
+    return face, "skip"
@@ -0,0 +1,284 @@
+# helpers/gallery.py
+
+import threading
+import time
+import numpy as np
+from helpers.data_storage import load_data, replace_user, upsert_users
+from helpers.embedding_store import open_store
+from helpers.face_recognition import model_tag as current_model_tag, model_tag_of, comparable
+from helpers.matchers import create_matcher
+from helpers.metrics import stage
+from helpers.templates import new_template, update_template, merge_template
+from config import (DATA_FILE, MATCHER_BACKEND, IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN_SIZE, INDEX_FILE,
+                    TEMPLATE_MAX_EXEMPLARS, TEMPLATE_MAX_COUNT, TEMPLATE_UPDATE_INTERVAL, TEMPLATE_MIN_NOVELTY)
+
+EMBEDDING_DIM = 128  # Facenet output size
+
+
+class EmbeddingGallery:
+    """Resident copy of all registered embeddings, used by authenticate().
+
+    The gallery validates stored records and hands them to a matcher backend
+    (see helpers/matchers.py) that owns the float32 matrix and does the search.
+    Each user's template centroid is one matcher row; the template exemplars
+    are kept aside, by name, and only looked at by identify() for borderline
+    matches. Stored users embedded with another pipeline than ``model_tag``
+    (default: this process's model_tag()) are left out: their distances to
+    this pipeline's embeddings mean nothing. Untagged legacy Facenet users
+    are still matched until they are re-embedded.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, backend="exact", model_tag=None, **options):
+        self.dim = dim
+        self.model_tag = model_tag or current_model_tag()
+        self.matcher = create_matcher(backend, dim, **options)
+        self.loaded = False
+        self.version = 0  # Bumped on every change, so cached matches can tell they are stale
+        self._exemplars = {}  # name -> (M, dim) float32
+
+    def __len__(self):
+        return len(self.users)
+
+    @property
+    def users(self):
+        return self.matcher.users
+
+    def load(self, records):
+        """Replace the gallery contents with a list of stored user records."""
+        users = []
+        rows = []
+        for record in records:
+            embedding = record.get("embedding")
+            if not isinstance(embedding, (list, np.ndarray)) or len(embedding) != self.dim:
+                print(f"Warning: Skipping user {record.get('name', 'Unknown')} due to missing or invalid embedding.")
+                continue
+            users.append({k: v for k, v in record.items() if k != "embedding"})
+            rows.append(embedding)
+
+        self.load_matrix(np.asarray(rows, dtype=np.float32).reshape(-1, self.dim), users)
+
+    def load_matrix(self, embeddings, users):
+        """Replace the gallery contents with an ``(N, dim)`` matrix and N user dicts.
+
+        A None user marks a row to skip (deleted rows of a store snapshot).
+        """
+        stale = [i for i, user in enumerate(users) if user is not None and not comparable(model_tag_of(user), self.model_tag)]
+        if stale:
+            print(f"Warning: Skipping {len(stale)} users embedded with another model than {self.model_tag} "
+                  f"(e.g. {model_tag_of(users[stale[0]])}); re-embed them with scripts/reembed_gallery.py "
+                  f"or restart with the matching model.")
+            users = list(users)
+            for i in stale:
+                users[i] = None
+        exemplars = {}
+        users = [self._split_exemplars(user, exemplars) for user in users]
+        self.matcher.build(embeddings, users)
+        self._exemplars = exemplars
+        self.loaded = True
+        self.version += 1
+
+    def add(self, record):
+        """Add one user record (with its ``embedding``) to the gallery."""
+        self.matcher.add(record["embedding"], self._user(record))
+        self.version += 1
+
+    def add_many(self, records):
+        """Add several user records at once (bulk enrollment)."""
+        users = [self._user(record) for record in records]
+        self.matcher.add_many([record["embedding"] for record in records], users)
+        self.version += 1
+
+    def replace(self, record):
+        """Swap every row of ``record["name"]`` for ``record`` (an updated template).
+
+        The same user with a slightly moved template: not a new version, so
+        cached matches and the user listing stay valid.
+        """
+        self.matcher.replace(record["name"], record["embedding"], self._user(record))
+
+    def remove(self, name):
+        """Drop every row registered under ``name``. Returns the number removed."""
+        self._exemplars.pop(name, None)
+        removed = self.matcher.remove(name)
+        self.version += 1
+        return removed
+
+    def apply_changes(self, changes):
+        """Apply the changes of EmbeddingStore.catch_up() (other processes' writes)."""
+        for kind, payload in changes:
+            if kind == "remove":
+                self.remove(payload)
+            elif not comparable(model_tag_of(payload if kind == "replace" else payload[0]), self.model_tag):
+                print(f"Warning: Skipping user written by another model than {self.model_tag}; "
+                      f"re-embed it with scripts/reembed_gallery.py or restart with the matching model.")
+            elif kind == "replace":
+                self.replace(payload)
+            else:
+                self.add_many(payload)
+
+    def template_of(self, name):
+        """Return the full stored record (with ``embedding`` and ``exemplars``) for ``name``.
+
+        Users registered several times before templates existed have several
+        rows; they are merged into one template here. Returns None if unknown.
+        """
+        embeddings, users = self.matcher.embeddings_of(name)
+        if not users:
+            return None
+        exemplars = self._exemplars.get(name)
+        if len(users) == 1:
+            record = dict(users[0], embedding=embeddings[0].tolist())
+            record.setdefault("template_count", 1)
+            if exemplars is not None:
+                record["exemplars"] = exemplars.tolist()
+            return record
+        if exemplars is not None:
+            embeddings = np.vstack([embeddings, exemplars])
+        return dict(users[0], **new_template(embeddings, TEMPLATE_MAX_EXEMPLARS))
+
+    def match(self, embedding, k=1):
+        """Return up to ``k`` ``(user, distance)`` pairs, closest first (L2 distance)."""
+        query = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        return self.matcher.search(query, k)
+
+    def identify(self, embedding, threshold, margin, candidates=3):
+        """Best ``(user, distance)`` for a probe, or ``(None, inf)`` for an empty gallery.
+
+        Only the template centroids are searched (one row per user). When the
+        best distance lands within ``margin`` of ``threshold`` the ``candidates``
+        closest users are re-scored against their exemplars, and each keeps the
+        smaller of its centroid and nearest-exemplar distance.
+        """
+        query = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        matches = self.matcher.search(query, candidates)
+        if not matches:
+            return None, float("inf")
+        if abs(matches[0][1] - threshold) > margin:
+            return matches[0]
+
+        rescored = []
+        for user, distance in matches:
+            exemplars = self._exemplars.get(user.get("name"))
+            if exemplars is not None and len(exemplars):
+                distance = min(distance, float(np.sqrt(((exemplars - query) ** 2).sum(axis=1).min())))
+            rescored.append((user, distance))
+        return min(rescored, key=lambda m: m[1])
+
+    def _user(self, record):
+        """Matcher-side user dict for ``record``; its exemplars are kept in the gallery."""
+        user = {k: v for k, v in record.items() if k != "embedding"}
+        return self._split_exemplars(user, self._exemplars)
+
+    def _split_exemplars(self, user, exemplars):
+        if user is not None and "exemplars" in user:
+            user = dict(user)
+            exemplars[user.get("name")] = np.asarray(user.pop("exemplars"), dtype=np.float32).reshape(-1, self.dim)
+        return user
+
+
+gallery = EmbeddingGallery(
+    backend=MATCHER_BACKEND,
+    **({"nlist": IVF_NLIST, "nprobe": IVF_NPROBE, "min_train_size": IVF_MIN_TRAIN_SIZE,
+        "index_file": INDEX_FILE} if MATCHER_BACKEND == "ivf" else {})
+)
+
+
+def get_gallery():
+    """Return the shared gallery, loading it from DATA_FILE on first use.
+
+    With the binary store the gallery also follows changes other processes
+    (e.g. the other workers started by scripts/serve.py) made to the store:
+    their sidecar lines are replayed onto it, and it is only reloaded after
+    a compaction or rewrite. This process's own writes are applied in place
+    by the callers.
+    """
+    store = open_store(DATA_FILE)
+    if gallery.loaded and store is not None and store.version != store.synced_version:
+        with stage("gallery_catch_up"):
+            changes = store.catch_up()
+        if changes is not None:
+            gallery.apply_changes(changes)
+            return gallery
+    if not gallery.loaded or (store is not None and store.version != store.synced_version):
+        with stage("gallery_load"):
+            if store is not None:
+                # Binary store: map the shared matrix directly, no per-user list conversion
+                gallery.load_matrix(*store.snapshot())
+            else:
+                gallery.load(load_data(DATA_FILE))
+    return gallery
+
+
+_template_lock = threading.Lock()
+
+
+def add_to_template(name, embedding):
+    """Fold a new embedding of ``name`` into its stored template.
+
+    Used for re-registration and for confident logins. Writes the storage first,
+    then swaps the gallery row. Returns the updated record, or None if
+    ``name`` is not registered.
+    """
+    return _update_template(name, lambda record: update_template(record, embedding, TEMPLATE_MAX_EXEMPLARS,
+                                                                 TEMPLATE_MAX_COUNT))
+
+
+def add_or_merge_templates(records):
+    """Store enrolled ``records`` (bulk enrollment) in one write.
+
+    Names that are already registered get the record merged into their
+    template, the others are added. Nothing is written for no records.
+    Returns the names that were already registered.
+    """
+    if not records:
+        return set()
+    with _template_lock:
+        gallery = get_gallery()
+        merged = []
+        new_records = []
+        for record in records:
+            stored = gallery.template_of(record["name"])
+            if stored is None:
+                new_records.append(record)
+            else:
+                merged.append(merge_template(stored, record, TEMPLATE_MAX_EXEMPLARS, TEMPLATE_MAX_COUNT))
+        upsert_users(DATA_FILE, merged + new_records)
+        for record in merged:
+            gallery.replace(record)
+        if new_records:
+            gallery.add_many(new_records)
+        return {record["name"] for record in merged}
+
+
+def _update_template(name, update):
+    with _template_lock:
+        gallery = get_gallery()
+        record = gallery.template_of(name)
+        if record is None:
+            return None
+        record = update(record)
+        replace_user(DATA_FILE, record)
+        gallery.replace(record)
+        return record
+
+
+_last_login_update = {}  # name -> time.monotonic() of its last login template update in this process
+
+
+def add_login_to_template(name, embedding, distance):
+    """Fold a confident login into ``name``'s template, if it is worth a write.
+
+    Every update is a durable write that every worker replays, so a login
+    only counts when it adds information (``distance`` of at least
+    TEMPLATE_MIN_NOVELTY) and at most once per TEMPLATE_UPDATE_INTERVAL
+    seconds per user. Returns the updated record, or None.
+    """
+    if distance < TEMPLATE_MIN_NOVELTY:
+        return None
+    now = time.monotonic()
+    with _template_lock:
+        last = _last_login_update.get(name)
+        if last is not None and now - last < TEMPLATE_UPDATE_INTERVAL:
+            return None
+        _last_login_update[name] = now
+    return add_to_template(name, embedding)
@@ -0,0 +1,103 @@
+# helpers/group_commit.py
+
+import os
+import threading
+import time
+
+
+class _Entry:
+    __slots__ = ("op", "done", "result", "error")
+
+    def __init__(self, op):
+        self.op = op
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommit:
+    """Coalesce concurrent writes into one durable commit.
+
+    ``submit(op)`` blocks until ``op`` has been committed and returns its
+    result. Commits run on a dedicated writer thread (a green thread under
+    eventlet): once an op arrives it waits ``max_delay`` seconds for others
+    to queue theirs, then calls ``commit(ops)`` with up to ``max_batch`` of
+    them in arrival order, and keeps going while more are queued. ``commit``
+    must return one result per op; if it raises, every op of that group gets
+    the exception. Callers only wait for their own op, so a caller
+    interrupted while waiting (e.g. by an ``eventlet.Timeout``) never affects
+    anyone else's write: its op is dropped if the writer hasn't taken it yet,
+    and committed anyway otherwise.
+
+    A burst of N registrations costs one write and one fsync instead of N,
+    and a caller is only answered once its write is on disk.
+    """
+
+    def __init__(self, commit, max_delay=0.002, max_batch=256):
+        self._commit = commit
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending = []
+        self._writer = None
+        self._pid = None
+        self.commits = 0
+        self.ops = 0
+
+    def submit(self, op):
+        entry = _Entry(op)
+        with self._cond:
+            self._ensure_writer()
+            self._pending.append(entry)
+            self._cond.notify()
+        try:
+            entry.done.wait()
+        except BaseException:
+            with self._cond:
+                if entry in self._pending:
+                    self._pending.remove(entry)  # Not taken by the writer yet: never committed
+            raise
+        if entry.error is not None:
+            raise entry.error
+        return entry.result
+
+    def _ensure_writer(self):
+        """Start the writer thread, again in a forked child (caller holds ``_cond``)."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = []  # Ops of the parent's callers are the parent's to commit
+            self._writer = None
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._writer.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            if self.max_delay:
+                time.sleep(self.max_delay)  # Let the rest of a burst queue up
+            while True:
+                with self._cond:
+                    group = self._pending[:self.max_batch]
+                    del self._pending[:len(group)]
+                if not group:
+                    break
+                self._commit_group(group)
+
+    def _commit_group(self, group):
+        try:
+            results = self._commit([entry.op for entry in group])
+            self.commits += 1
+            self.ops += len(group)
+            for entry, result in zip(group, results):
+                entry.result = result
+        except BaseException as e:
+            for entry in group:
+                entry.error = e if isinstance(e, Exception) else RuntimeError("Write interrupted, it may not have been saved")
+            if not isinstance(e, Exception):
+                raise  # The writer is stopping; the next submit() starts a new one
+        finally:
+            for entry in group:
+                entry.done.set()
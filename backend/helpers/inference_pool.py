@@ -0,0 +1,330 @@
+# helpers/inference_pool.py
+
+import atexit
+import itertools
+import multiprocessing
+import threading
+import time
+from collections import Counter
+from helpers.face_recognition import DETECTOR_BACKEND
+from helpers.metrics import STAGE_SECONDS, INFERENCE_REJECTED, INFERENCE_BATCH_SIZE, stage
+
+try:
+    import eventlet
+    from eventlet.hubs import trampoline
+except ImportError:  # CLI / scripts can run without eventlet
+    eventlet = None
+
+
+class InferenceBusy(Exception):
+    """The pool already holds as many jobs as it accepts; the caller should retry later."""
+
+
+class InferenceTimeout(Exception):
+    """The job did not finish before its deadline (the worker running it was killed)."""
+
+
+def _is_green():
+    return eventlet is not None and eventlet.patcher.is_monkey_patched("thread")
+
+
+def _wait_readable(conn, timeout):
+    """Wait until ``conn`` has data, yielding to the eventlet hub when it is running."""
+    if _is_green():
+        try:
+            trampoline(conn.fileno(), read=True, timeout=timeout, timeout_exc=InferenceTimeout)
+        except InferenceTimeout:
+            return False
+        return True
+    return conn.poll(timeout)
+
+
+def _worker_main(conn):
+    """Worker process: load the models once, then embed batches of images sent over ``conn``."""
+    from helpers.face_recognition import extract_embeddings
+    from helpers.model_lifecycle import load_models
+
+    conn.send(("ready", load_models()))
+    while True:
+        try:
+            batch_id, images, detector_backends = conn.recv()
+        except EOFError:
+            break
+        if batch_id is None:
+            break
+        timings = {}
+        embeddings = extract_embeddings(images, detector_backends, timings)
+        conn.send((batch_id, embeddings, timings))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.conn.close()
+        self.process.join(timeout=1)
+
+
+class _Job:
+    __slots__ = ("image", "detector_backend", "deadline", "queued_at", "done", "result", "error", "cancelled")
+
+    def __init__(self, image, detector_backend, deadline):
+        self.image = image
+        self.detector_backend = detector_backend
+        self.deadline = deadline
+        self.queued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+
+class InferencePool:
+    """Fixed set of worker processes running Facenet off the eventlet hub.
+
+    ``embed()`` queues the image and waits cooperatively for its result, so
+    other sockets keep being served while TensorFlow runs. A dispatcher thread
+    micro-batches the queue: once a worker is idle it waits up to
+    ``batch_delay_ms`` for ``batch_size`` jobs to arrive and sends them as one
+    batch, which the worker embeds with a single Facenet forward pass.
+
+    Deadlines are real: a worker still computing when its batch's last
+    deadline passes is killed and replaced. At most one full batch per worker
+    plus ``max_pending`` jobs are accepted at once; beyond that ``embed()``
+    raises InferenceBusy straight away instead of queueing.
+
+    With ``workers=0`` embeddings are computed inline (CLI tools, debugging).
+    """
+
+    def __init__(self, workers, max_pending, batch_size=1, batch_delay_ms=0):
+        self.size = workers
+        self.max_pending = max_pending
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay_ms / 1000.0
+        self._ctx = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+        self._cond = threading.Condition()
+        self._idle = []
+        self._workers = set()
+        self._ready = set()
+        self._queue = []
+        self._pending = 0
+        self._batch_ids = itertools.count(1)
+        self._batch_sizes = Counter()
+        self._first_batch_logged = False
+        self._started = False
+
+    def start(self):
+        with self._cond:
+            if self._started or self.size == 0:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._spawn()
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        with self._cond:
+            workers = list(self._workers)
+            self._workers.clear()
+            self._ready.clear()
+            self._idle.clear()
+            self._started = False
+            self._cond.notify_all()
+        for worker in workers:
+            worker.kill()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    @property
+    def queued(self):
+        """Jobs waiting for a worker (the rest of ``pending`` is being embedded)."""
+        return len(self._queue)
+
+    @property
+    def capacity(self):
+        """Jobs accepted at once before ``embed()`` raises InferenceBusy."""
+        return self.size * self.batch_size + self.max_pending
+
+    @property
+    def idle_workers(self):
+        return len(self._idle)
+
+    def wait_ready(self, timeout=None):
+        """Wait until every live worker has loaded its models. False if ``timeout`` passed first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while len(self._ready) < len(self._workers):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return self.size == 0 or len(self._ready) > 0
+
+    @property
+    def ready_workers(self):
+        """Workers that have loaded and warmed up their models."""
+        return len(self._ready)
+
+    def stats(self):
+        """Achieved batch sizes since startup."""
+        with self._cond:
+            sizes = dict(self._batch_sizes)
+        batches = sum(sizes.values())
+        items = sum(size * count for size, count in sizes.items())
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "batch_size_histogram": {str(size): sizes[size] for size in sorted(sizes)},
+        }
+
+    def embed(self, image, timeout, detector_backend=DETECTOR_BACKEND):
+        """Return the Facenet embedding of ``image`` (or None if no face was found).
+
+        Pass ``detector_backend="skip"`` for an already cropped face.
+        """
+        if self.size == 0:
+            from helpers.face_recognition import extract_embedding
+            with stage("inference"):
+                return extract_embedding(image, detector_backend)
+
+        self.start()
+        job = _Job(image, detector_backend, time.monotonic() + timeout)
+        with self._cond:
+            if self._pending >= self.capacity:
+                INFERENCE_REJECTED.inc(reason="busy")
+                raise InferenceBusy()
+            self._pending += 1
+            self._queue.append(job)
+            self._cond.notify_all()
+        try:
+            if not job.done.wait(timeout):
+                INFERENCE_REJECTED.inc(reason="timeout")
+                raise InferenceTimeout()
+            if job.error is not None:
+                INFERENCE_REJECTED.inc(reason="timeout" if isinstance(job.error, InferenceTimeout) else "error")
+                raise job.error
+            return job.result
+        finally:
+            # Also covers an outer eventlet.Timeout: a job nobody waits for is not sent
+            job.cancelled = True
+            with self._cond:
+                self._pending -= 1
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._started:
+                        return
+                    self._queue = [job for job in self._queue if not job.cancelled]
+                    if self._queue and self._idle:
+                        wait = self._queue[0].queued_at + self.batch_delay - time.monotonic()
+                        if len(self._queue) >= self.batch_size or wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                batch = self._queue[:self.batch_size]
+                del self._queue[:self.batch_size]
+                worker = self._idle.pop()
+            threading.Thread(target=self._run_batch, args=(worker, batch), daemon=True).start()
+
+    def _run_batch(self, worker, jobs):
+        batch_id = next(self._batch_ids)
+        deadline = max(job.deadline for job in jobs)
+        start = time.monotonic()
+        for job in jobs:
+            STAGE_SECONDS.observe(start - job.queued_at, stage="inference_queue")
+        try:
+            worker.conn.send((batch_id, [job.image for job in jobs], [job.detector_backend for job in jobs]))
+            if not _wait_readable(worker.conn, max(0.0, deadline - time.monotonic())):
+                raise InferenceTimeout()
+            result_id, embeddings, timings = worker.conn.recv()
+            if result_id != batch_id:
+                raise RuntimeError("Inference worker returned a result for the wrong batch")
+        except Exception as e:
+            # Timed out or the worker died mid-batch: its state is unknown, so replace it
+            self._replace(worker)
+            for job in jobs:
+                job.error = InferenceTimeout() if isinstance(e, InferenceTimeout) else RuntimeError(str(e))
+                job.done.set()
+            return
+
+        elapsed = time.monotonic() - start
+        if not self._first_batch_logged:
+            self._first_batch_logged = True
+            print(f"First inference batch ({len(jobs)} frames) took {elapsed:.2f}s")
+        # Round trip to the worker, and the detection / Facenet split it measured itself
+        STAGE_SECONDS.observe(elapsed, stage="inference")
+        for name, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, stage=name)
+        INFERENCE_BATCH_SIZE.observe(len(jobs))
+        with self._cond:
+            self._batch_sizes[len(jobs)] += 1
+            self._idle.append(worker)
+            self._cond.notify_all()
+        for job, embedding in zip(jobs, embeddings):
+            job.result = embedding
+            job.done.set()
+
+    def _spawn(self):
+        worker = _Worker(self._ctx)
+        with self._cond:
+            self._workers.add(worker)
+        threading.Thread(target=self._await_ready, args=(worker,), daemon=True).start()
+
+    def _await_ready(self, worker):
+        start = time.monotonic()
+        try:
+            _wait_readable(worker.conn, None)
+            _, timings = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            print(f"Inference worker {worker.process.pid} failed to start: {str(e)}")
+            with self._cond:
+                self._workers.discard(worker)
+            return
+        print(f"Inference worker {worker.process.pid} ready in {time.monotonic() - start:.1f}s "
+              f"(model load {timings['load_seconds']:.2f}s, warm-up {timings['warmup_seconds']:.2f}s)")
+        with self._cond:
+            if worker in self._workers:
+                self._ready.add(worker)
+                self._idle.append(worker)
+                self._cond.notify_all()
+
+    def _replace(self, worker):
+        with self._cond:
+            self._workers.discard(worker)
+            self._ready.discard(worker)
+            restart = self._started
+        worker.kill()
+        if restart:
+            self._spawn()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool(workers=None):
+    """Return the shared pool configured by the INFERENCE_* settings in config.py.
+
+    ``workers`` overrides INFERENCE_WORKERS; it only has an effect on the
+    first call (scripts/serve.py splits the workers between web processes).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from config import (INFERENCE_WORKERS, INFERENCE_MAX_PENDING,
+                                INFERENCE_BATCH_SIZE, INFERENCE_BATCH_DELAY_MS)
+            _pool = InferencePool(INFERENCE_WORKERS if workers is None else workers, INFERENCE_MAX_PENDING,
+                                  INFERENCE_BATCH_SIZE, INFERENCE_BATCH_DELAY_MS)
+        return _pool
@@ -0,0 +1,113 @@
+# helpers/login_log.py
+
+import json
+import os
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS login_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_login_logs_name_date ON login_logs (name, date, time);
+CREATE INDEX IF NOT EXISTS idx_login_logs_date ON login_logs (date, time);
+"""
+
+
+class LoginLogStore:
+    """Append-only login log in SQLite, indexed by username and date.
+
+    Each login is a single INSERT, so concurrent writers never drop entries,
+    and dashboard queries only read the rows they display. Entries from the
+    legacy JSON log file are imported once, when the database is created.
+    """
+
+    def __init__(self, db_path, legacy_json_path=None):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._initialize(conn)
+                    self._initialized = True
+        return conn
+
+    def _initialize(self, conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            is_new = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='login_logs'"
+            ).fetchone() is None
+            conn.executescript(_SCHEMA)
+            if is_new:
+                self._import_legacy(conn)
+
+    def _import_legacy(self, conn):
+        if not self.legacy_json_path or not os.path.exists(self.legacy_json_path):
+            return
+        try:
+            with open(self.legacy_json_path, "r") as f:
+                logs = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not import legacy login log {self.legacy_json_path}: {str(e)}")
+            return
+        if not isinstance(logs, list):
+            return
+        rows = [(log.get("name"), log.get("date"), log.get("time")) for log in logs
+                if isinstance(log, dict) and log.get("name") and log.get("date") and log.get("time")]
+        conn.executemany("INSERT INTO login_logs (name, date, time) VALUES (?, ?, ?)", rows)
+        print(f"Imported {len(rows)} login log entries from {self.legacy_json_path}")
+
+    def record(self, name, date, time):
+        """Append one login entry."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("INSERT INTO login_logs (name, date, time) VALUES (?, ?, ?)", (name, date, time))
+        finally:
+            conn.close()
+
+    def query(self, name=None, date_from=None, date_to=None, limit=None, offset=0, newest_first=False):
+        """Return ``(entries, total)`` for the matching logins, oldest first by default.
+
+        ``date_from``/``date_to`` are inclusive 'YYYY-MM-DD' bounds. ``total``
+        is the number of matching entries before ``limit``/``offset``.
+        """
+        clauses = []
+        params = []
+        if name:
+            clauses.append("name = ?")
+            params.append(name)
+        if date_from:
+            clauses.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("date <= ?")
+            params.append(date_to)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        conn = self._connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM login_logs{where}", params).fetchone()[0]
+            order = "DESC" if newest_first else "ASC"
+            sql = f"SELECT name, date, time FROM login_logs{where} ORDER BY date {order}, time {order}, id {order}"
+            page_params = list(params)
+            if limit is not None:
+                sql += " LIMIT ? OFFSET ?"
+                page_params += [limit, offset]
+            elif offset:
+                sql += " LIMIT -1 OFFSET ?"
+                page_params.append(offset)
+            entries = [dict(row) for row in conn.execute(sql, page_params)]
+            return entries, total
+        finally:
+            conn.close()
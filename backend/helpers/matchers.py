@@ -0,0 +1,343 @@
+# helpers/matchers.py
+
+import os
+import threading
+import numpy as np
+
+
+def _pack(embeddings, users):
+    """Build an immutable ``(embeddings, sq_norms, users)`` block.
+
+    ``embeddings`` is used as is when already contiguous float32 (e.g. a
+    shared read-only memory map). A None user marks a deleted row: its norm is
+    set to infinity so it never matches.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    sq_norms = np.einsum("ij,ij->i", embeddings, embeddings)
+    dead = [i for i, user in enumerate(users) if user is None]
+    if dead:
+        sq_norms[dead] = np.inf
+    return embeddings, sq_norms, users
+
+
+def _search_block(block, query, k):
+    """Exact top-k L2 search inside one block. Returns ``(sq_dists, users)``."""
+    embeddings, sq_norms, users = block
+    if not users:
+        return np.empty((0,), dtype=np.float32), []
+
+    # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b, with the gallery norms precomputed
+    sq_dist = sq_norms + np.dot(query, query) - 2.0 * (embeddings @ query)
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+
+    k = min(k, len(users))
+    if k == 1:
+        top = np.array([np.argmin(sq_dist)])
+    else:
+        top = np.argpartition(sq_dist, k - 1)[:k]
+        top = top[np.argsort(sq_dist[top])]
+    top = top[np.isfinite(sq_dist[top])]  # Deleted rows
+    return sq_dist[top], [users[i] for i in top]
+
+
+def _remove_from_block(block, name):
+    embeddings, _, users = block
+    rows = [i for i, user in enumerate(users) if user is not None and user.get("name") == name]
+    if not rows:
+        return block, 0
+    # Deleted rows of a shared snapshot are dropped here too, now that the block is copied anyway
+    keep = [i for i, user in enumerate(users) if user is not None and user.get("name") != name]
+    return _pack(embeddings[keep], [users[i] for i in keep]), len(rows)
+
+
+def _rows_of(block, name):
+    embeddings, _, users = block
+    rows = [i for i, user in enumerate(users) if user is not None and user.get("name") == name]
+    return embeddings[rows], [users[i] for i in rows]
+
+
+class ExactMatcher:
+    """Brute-force L2 over one contiguous float32 matrix, plus a small delta.
+
+    The base block is what build() was given (e.g. the store's shared,
+    read-only memory map) and is never copied on writes: rows added later go
+    to a small delta block, and removed or replaced rows are retired in
+    place (infinite norm, no user). The delta is merged into a new base once
+    it holds ``max_delta`` rows. A search grabs both blocks without locking.
+    """
+
+    def __init__(self, dim, max_delta=4096):
+        self.dim = dim
+        self.max_delta = max_delta
+        self._lock = threading.Lock()
+        self._block = _pack(np.empty((0, dim)), [])
+        self._delta = _pack(np.empty((0, dim)), [])
+        self._rows = {}  # name -> live rows of the base block
+
+    @property
+    def users(self):
+        return [user for block in (self._block, self._delta) for user in block[2] if user is not None]
+
+    def build(self, embeddings, users):
+        """Replace the contents. ``users`` may hold None for rows to ignore."""
+        with self._lock:
+            self._rebuild(embeddings, list(users))
+
+    def add(self, embedding, user):
+        self.add_many([embedding], [user])
+
+    def add_many(self, new_embeddings, new_users):
+        rows = np.asarray(new_embeddings, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            self._append(rows, list(new_users))
+
+    def remove(self, name):
+        with self._lock:
+            return self._retire(name)
+
+    def replace(self, name, embedding, user):
+        """Swap every row of ``name`` for one new row (a template update), without copying the base."""
+        row = np.asarray(embedding, dtype=np.float32).reshape(1, self.dim)
+        with self._lock:
+            self._retire(name)
+            self._append(row, [user])
+
+    def embeddings_of(self, name):
+        """Return ``(embeddings, users)`` for the rows registered under ``name``."""
+        embeddings, _, users = self._block
+        rows = self._rows.get(name, [])
+        delta_embeddings, delta_users = _rows_of(self._delta, name)
+        return (np.vstack([embeddings[rows], delta_embeddings]).reshape(-1, self.dim),
+                [users[i] for i in rows] + delta_users)
+
+    def search(self, query, k=1):
+        found = []
+        for block in (self._block, self._delta):
+            sq_dist, users = _search_block(block, query, k)
+            found.extend((user, d) for user, d in zip(users, sq_dist) if user is not None)
+        found.sort(key=lambda match: match[1])
+        return [(user, float(np.sqrt(d))) for user, d in found[:k]]
+
+    def _retire(self, name):
+        """Mark every row of ``name`` deleted in place (caller holds the lock)."""
+        _, sq_norms, users = self._block
+        rows = self._rows.pop(name, [])
+        for i in rows:
+            sq_norms[i] = np.inf  # Before the user goes, so a concurrent search never returns None
+            users[i] = None
+        delta, removed = _remove_from_block(self._delta, name)
+        self._delta = delta
+        return len(rows) + removed
+
+    def _append(self, rows, new_users):
+        embeddings, _, users = self._delta
+        delta = _pack(np.vstack([embeddings, rows]), users + new_users)
+        if len(delta[2]) < self.max_delta:
+            self._delta = delta
+            return
+        # Merge: one copy of the live rows every max_delta additions
+        base_embeddings, _, base_users = self._block
+        live = [i for i, user in enumerate(base_users) if user is not None]
+        self._rebuild(np.vstack([base_embeddings[live], delta[0]]), [base_users[i] for i in live] + delta[2])
+
+    def _rebuild(self, embeddings, users):
+        """New base block with an empty delta (caller holds the lock)."""
+        block = _pack(embeddings, users)
+        self._rows = {}
+        for i, user in enumerate(users):
+            if user is not None:
+                self._rows.setdefault(user.get("name"), []).append(i)
+        self._block, self._delta = block, _pack(np.empty((0, self.dim)), [])
+
+
+class IVFMatcher:
+    """Inverted-file index: k-means centroids over the gallery, one block per list.
+
+    A query is compared against the centroids and only the ``nprobe`` closest
+    lists are searched exactly. Until the gallery reaches ``min_train_size``
+    rows there are no centroids and every row lives in a single list, so small
+    galleries are still searched exactly.
+    """
+
+    def __init__(self, dim, nlist=256, nprobe=8, min_train_size=10000, index_file=None):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._state = (None, (_pack(np.empty((0, dim)), []),))
+
+    @property
+    def users(self):
+        return [user for block in self._state[1] for user in block[2] if user is not None]
+
+    @property
+    def trained(self):
+        return self._state[0] is not None
+
+    def build(self, embeddings, users):
+        """Replace the contents. ``users`` may hold None for rows to ignore."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        live = [i for i, user in enumerate(users) if user is not None]
+        if len(live) < len(users):
+            # The lists are copies anyway: leave deleted rows out
+            embeddings, users = embeddings[live], [users[i] for i in live]
+        centroids = self._load_centroids()
+        if centroids is None and len(users) >= self.min_train_size:
+            centroids = self._train(embeddings)
+            self._save_centroids(centroids)
+        with self._lock:
+            self._state = self._partition(centroids, embeddings, users)
+
+    def add(self, embedding, user):
+        self.add_many([embedding], [user])
+
+    def add_many(self, new_embeddings, new_users):
+        rows = np.asarray(new_embeddings, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            self._state = self._with_rows(self._state, rows, list(new_users))
+
+    def remove(self, name):
+        with self._lock:
+            state, removed = self._without(self._state, name)
+            if removed:
+                self._state = state
+            return removed
+
+    def replace(self, name, embedding, user):
+        """Swap every row of ``name`` for one new row, in a single state change."""
+        row = np.asarray(embedding, dtype=np.float32).reshape(1, self.dim)
+        with self._lock:
+            state, _ = self._without(self._state, name)
+            self._state = self._with_rows(state, row, [user])
+
+    def embeddings_of(self, name):
+        """Return ``(embeddings, users)`` for the rows registered under ``name``."""
+        found = [_rows_of(block, name) for block in self._state[1]]
+        embeddings = np.vstack([rows for rows, _ in found])
+        return embeddings, [user for _, users in found for user in users]
+
+    def _with_rows(self, state, rows, new_users):
+        centroids, lists = state
+        if centroids is None:
+            embeddings, _, users = lists[0]
+            embeddings, users = np.vstack([embeddings, rows]), users + new_users
+            if len(users) >= self.min_train_size:
+                # Gallery just grew big enough: train and repartition once
+                centroids = self._train(embeddings)
+                self._save_centroids(centroids)
+                return self._partition(centroids, embeddings, users)
+            return None, (_pack(embeddings, users),)
+
+        assign = self._assign(centroids, rows)
+        lists = list(lists)
+        for target in np.unique(assign):
+            members = np.flatnonzero(assign == target)
+            embeddings, _, users = lists[target]
+            lists[target] = _pack(np.vstack([embeddings, rows[members]]),
+                                  users + [new_users[i] for i in members])
+        return centroids, tuple(lists)
+
+    @staticmethod
+    def _without(state, name):
+        centroids, lists = state
+        removed = 0
+        new_lists = []
+        for block in lists:
+            block, n = _remove_from_block(block, name)
+            removed += n
+            new_lists.append(block)
+        return (centroids, tuple(new_lists)), removed
+
+    def search(self, query, k=1):
+        centroids, lists = self._state
+        if centroids is None:
+            probe = [0]
+        else:
+            sq_dist = self._centroid_sq_dists(centroids, query)
+            nprobe = min(self.nprobe, len(lists))
+            probe = np.argpartition(sq_dist, nprobe - 1)[:nprobe]
+
+        candidates = []
+        for i in probe:
+            sq_dists, users = _search_block(lists[i], query, k)
+            candidates.extend(zip(sq_dists, users))
+        candidates.sort(key=lambda c: c[0])
+        return [(user, float(np.sqrt(d))) for d, user in candidates[:k]]
+
+    # --- Training / persistence ---
+
+    def _train(self, embeddings, iterations=10, seed=0):
+        """Plain Lloyd's k-means on a sample of the gallery."""
+        rng = np.random.default_rng(seed)
+        nlist = min(self.nlist, len(embeddings))
+        sample_size = min(len(embeddings), nlist * 64)
+        sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = self._assign(centroids, sample)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+                else:
+                    # Re-seed empty clusters from a random sample point
+                    centroids[c] = sample[rng.integers(sample_size)]
+        return centroids
+
+    def _partition(self, centroids, embeddings, users):
+        if centroids is None:
+            return None, (_pack(embeddings, users),)
+        assign = self._assign(centroids, embeddings)
+        lists = []
+        for c in range(len(centroids)):
+            rows = np.flatnonzero(assign == c)
+            lists.append(_pack(embeddings[rows], [users[i] for i in rows]))
+        return centroids, tuple(lists)
+
+    @staticmethod
+    def _assign(centroids, embeddings, chunk=8192):
+        c_norms = np.einsum("ij,ij->i", centroids, centroids)
+        assign = np.empty(len(embeddings), dtype=np.int64)
+        for start in range(0, len(embeddings), chunk):
+            part = embeddings[start:start + chunk]
+            assign[start:start + chunk] = np.argmin(c_norms - 2.0 * (part @ centroids.T), axis=1)
+        return assign
+
+    @staticmethod
+    def _centroid_sq_dists(centroids, query):
+        return np.einsum("ij,ij->i", centroids, centroids) - 2.0 * (centroids @ query)
+
+    def _load_centroids(self):
+        if not self.index_file or not os.path.exists(self.index_file):
+            return None
+        try:
+            with np.load(self.index_file) as stored:
+                centroids = stored["centroids"].astype(np.float32)
+        except Exception as e:
+            print(f"Ignoring unreadable index file {self.index_file}: {str(e)}")
+            return None
+        if centroids.ndim != 2 or centroids.shape[1] != self.dim or len(centroids) != self.nlist:
+            return None
+        return centroids
+
+    def _save_centroids(self, centroids):
+        if not self.index_file:
+            return
+        try:
+            tmp_path = self.index_file + ".tmp.npz"
+            np.savez(tmp_path, centroids=centroids)
+            os.replace(tmp_path, self.index_file)
+        except Exception as e:
+            print(f"Error saving index: {str(e)}")
+
+
+def create_matcher(backend, dim, **options):
+    """Build the matcher named by ``MATCHER_BACKEND`` in config.py."""
+    if backend == "exact":
+        return ExactMatcher(dim)
+    if backend == "ivf":
+        return IVFMatcher(dim, **options)
+    raise ValueError(f"Unknown matcher backend: {backend}")
@@ -0,0 +1,179 @@
+# helpers/metrics.py
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from config import METRICS_ENABLED
+
+# Latency buckets in seconds: sub-millisecond matching up to multi-second inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_disabled = nullcontext()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{self._labels(key)} {value}"
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (Prometheus layout), optionally split by labels."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def time(self, **labels):
+        """Context manager observing the elapsed wall time of its block."""
+        if not METRICS_ENABLED:
+            return _disabled
+        return self._timer(labels)
+
+    @contextmanager
+    def _timer(self, labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{self._labels(key, ('le', bound))} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {counts[-1]}"
+            yield f"{self.name}_count{self._labels(key)} {cumulative}"
+
+
+class Collected(_Metric):
+    """Gauge or counter read from ``collect()`` at scrape time.
+
+    ``collect`` returns a number, or ``{label value: number}`` when one label
+    name is given. Used for state the app already tracks (queue depth, worker
+    counts, face gate and cache counters), so the hot path pays nothing.
+    """
+
+    def __init__(self, name, help_text, collect, kind="gauge", labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def _samples(self):
+        value = self.collect()
+        if not self.labelnames:
+            yield f"{self.name} {value}"
+            return
+        for label, v in sorted(value.items()):
+            yield f"{self.name}{self._labels((label,))} {v}"
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            print(f"Error collecting metric {metric.name}: {str(e)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Recognition pipeline metrics ---
+
+STAGE_SECONDS = Histogram(
+    "faceauth_stage_seconds",
+    "Time spent in each stage of the recognition pipeline",
+    labelnames=("stage",))
+FRAMES = Counter(
+    "faceauth_frames_total",
+    "Authentication frames by outcome",
+    labelnames=("outcome",))
+AUTH_DECISIONS = Counter(
+    "faceauth_auth_decisions_total",
+    "Multi-frame login decisions by result",
+    labelnames=("decision",))
+AUTH_DECISION_FRAMES = Histogram(
+    "faceauth_auth_decision_frames",
+    "Embedded frames a session needed before its login decision",
+    labelnames=("decision",),
+    buckets=(1, 2, 3, 4, 5, 6, 8, 12, 16))
+INFERENCE_REJECTED = Counter(
+    "faceauth_inference_rejected_total",
+    "Embedding requests refused by the inference pool",
+    labelnames=("reason",))
+INFERENCE_BATCH_SIZE = Histogram(
+    "faceauth_inference_batch_size",
+    "Frames per Facenet forward pass",
+    buckets=(1, 2, 4, 8, 16, 32))
+
+
+def stage(name):
+    """``with stage("decode"): ...`` records the block's latency under that stage."""
+    return STAGE_SECONDS.time(stage=name)
@@ -0,0 +1,60 @@
+# helpers/model_lifecycle.py
+
+import time
+import numpy as np
+from helpers.embedding_models import get_embedding_model
+from helpers.face_recognition import DETECTOR_BACKEND
+
+_status = {"loaded": False, "backend": None, "load_seconds": None, "warmup_seconds": None}
+
+
+def load_models():
+    """Build Facenet and the face detector once, then run a warm-up inference.
+
+    DeepFace (and with it TensorFlow) is only imported here, so modules that
+    never embed a face don't pay for it. With an exported EMBEDDING_BACKEND
+    and the face gate on, DeepFace isn't needed at all and is not loaded.
+    Safe to call repeatedly; returns the load/warm-up timings.
+    """
+    if _status["loaded"]:
+        return dict(_status)
+
+    start = time.perf_counter()
+    model = get_embedding_model()
+    if needs_detector():
+        from deepface import DeepFace
+        DeepFace.build_model(DETECTOR_BACKEND, task="face_detector")
+    _status["backend"] = model.name
+    _status["load_seconds"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    warm_up()
+    _status["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    _status["loaded"] = True
+
+    print(f"Models loaded in {_status['load_seconds']:.2f}s, warm-up inference took {_status['warmup_seconds']:.2f}s")
+    return dict(_status)
+
+
+def needs_detector():
+    """Whether DeepFace's face detector can be used: always for the DeepFace backend, otherwise
+    only when the face gate is off (gated crops are embedded with ``detector_backend="skip"``)."""
+    from config import EMBEDDING_BACKEND, FACE_GATE_ENABLED
+    return EMBEDDING_BACKEND == "deepface" or not FACE_GATE_ENABLED
+
+
+def warm_up():
+    """Run the detector and one Facenet forward pass on blank input to build the graphs."""
+    if needs_detector():
+        from deepface.modules import detection
+        blank = np.zeros((240, 320, 3), dtype=np.uint8)
+        detection.extract_faces(img_path=blank, detector_backend=DETECTOR_BACKEND, enforce_detection=False)
+
+    model = get_embedding_model()
+    height, width = model.input_shape
+    model.predict(np.zeros((1, width, height, 3), dtype=np.float32))
+
+
+def status():
+    """Whether the models are loaded in this process, with their timings."""
+    return dict(_status)
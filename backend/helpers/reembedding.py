@@ -0,0 +1,223 @@
+# helpers/reembedding.py
+
+import json
+import os
+from helpers.bulk_enrollment import enroll
+from helpers.data_storage import load_data, save_data, storage_lock
+from helpers.face_recognition import model_tag as current_model_tag, model_tag_of
+from helpers.file_lock import FileLock, atomic_write
+
+TEMPLATE_FIELDS = ("embedding", "template_count", "exemplars", "model")
+
+
+class ReembedError(Exception):
+    """The new gallery can't replace the old one (e.g. users without usable images)."""
+
+
+class ReembedJob:
+    """Re-embed every user from their kept enrollment images with the current model.
+
+    The new templates are built side by side in a staging journal next to the
+    data file (``data.reembed.jsonl``), one line per user with the image
+    files it was computed from, appended and fsynced after every batch. The
+    live gallery isn't touched meanwhile, so the server keeps authenticating
+    against it, and an interrupted job resumes where it stopped.
+
+    switch_over() then checks every user has a template and marks the
+    journal ready (``data.reembed.switch``), still without touching the live
+    gallery: running servers have the old model loaded and would skip every
+    re-embedded user. The first server started with the new model applies it
+    (apply_switch(), from apply_pending_switch() at startup) in one atomic
+    write. Template updates from logins made meanwhile are not carried over
+    (templates restart from the enrollment images).
+    """
+
+    def __init__(self, data_file, images, pool, max_frame_width, timeout, max_exemplars=5,
+                 model_tag=None, batch_users=64):
+        self.data_file = data_file
+        self.images = images
+        self.pool = pool
+        self.max_frame_width = max_frame_width
+        self.timeout = timeout
+        self.max_exemplars = max_exemplars
+        self.model_tag = model_tag or current_model_tag()
+        self.batch_users = batch_users
+        self.staging_file = os.path.splitext(data_file)[0] + ".reembed.jsonl"
+        self.switch_file = os.path.splitext(data_file)[0] + ".reembed.switch"  # Journal complete, apply at startup
+        self._lock = FileLock(self.staging_file + ".lock")  # One job at a time
+
+    def staged(self):
+        """``{name: entry}`` of the users already re-embedded for ``model_tag``.
+
+        An entry holds the ``images`` it was computed from and either a
+        ``template`` or the ``error`` that prevented one. A torn last line
+        from an interrupted job is ignored (that user is simply redone).
+        """
+        staged = {}
+        try:
+            with open(self.staging_file, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if entry.get("model") == self.model_tag:
+                        staged[entry["name"]] = entry
+        except FileNotFoundError:
+            pass
+        return staged
+
+    def pending(self, records, staged=None):
+        """Names in ``records`` that still need embedding: not staged, or their images changed since."""
+        staged = self.staged() if staged is None else staged
+        names = []
+        seen = set()
+        for record in records:
+            name = record.get("name")
+            if model_tag_of(record) == self.model_tag or name in seen:
+                continue
+            seen.add(name)
+            entry = staged.get(name)
+            if entry is None or entry["images"] != self.images.files(name):
+                names.append(name)
+        return names
+
+    def run(self, names, progress=None):
+        """Embed ``names`` in batches of ``batch_users``, staging each batch before the next.
+
+        The images of a batch are embedded concurrently through ``pool``.
+        ``progress(done, total, failed)`` is called after every batch.
+        """
+        done = failed = 0
+        with self._lock:
+            self._drop_torn_line()
+            for start in range(0, len(names), self.batch_users):
+                batch = names[start:start + self.batch_users]
+                entries = self._embed(batch)
+                payload = "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+                with open(self.staging_file, "ab") as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                done += len(batch)
+                failed += sum(1 for entry in entries if "error" in entry)
+                if progress is not None:
+                    progress(done, len(names), failed)
+        return done, failed
+
+    def _drop_torn_line(self):
+        """Cut a half-written last line off the journal, so the next append starts a fresh line."""
+        try:
+            with open(self.staging_file, "r+b") as f:
+                payload = f.read()
+                if payload and not payload.endswith(b"\n"):
+                    f.truncate(payload.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def _embed(self, names):
+        files = {name: self.images.files(name) for name in names}
+        items = [item for name in names for item in self.images.items(name)]
+        records, report = enroll(items, "", self.pool, self.max_frame_width, self.timeout, self.max_exemplars)
+        templates = {record["name"]: {k: record[k] for k in TEMPLATE_FIELDS if k in record} for record in records}
+        errors = {r["name"]: r["error"] for r in report["identities"] if r["status"] == "failed"}
+
+        entries = []
+        for name in names:
+            entry = {"name": name, "model": self.model_tag, "images": files[name]}
+            if not files[name]:
+                entry["error"] = "No enrollment images kept"
+            elif name in templates:
+                entry["template"] = dict(templates[name], model=self.model_tag)
+            else:
+                entry["error"] = errors.get(name, "No usable face in any image")
+            entries.append(entry)
+        return entries
+
+    def switch_over(self, drop_missing=False):
+        """Mark the re-embedded gallery ready to replace the live one at the next restart.
+
+        Holds the storage lock while checking, so no write can land in
+        between: users that changed since the last run() are embedded here
+        first. Users without a template (no kept images, or no face found
+        with the new model) make it fail with ReembedError, unless
+        ``drop_missing``, which drops them at the switch (they have to
+        register again). Returns ``(users, dropped_names)``.
+        """
+        with storage_lock(self.data_file), self._lock:
+            records = load_data(self.data_file)
+            late = self.pending(records)
+            if late:
+                self.run(late)
+            staged = self.staged()
+
+            users = set()
+            missing = {}
+            for record in records:
+                name = record.get("name")
+                users.add(name)
+                entry = staged.get(name)
+                if model_tag_of(record) != self.model_tag and "template" not in entry:
+                    missing[name] = entry["error"]
+
+            if missing and not drop_missing:
+                raise ReembedError(f"{len(missing)} users can't be re-embedded: " +
+                                   ", ".join(f"{name} ({error})" for name, error in sorted(missing.items())))
+            atomic_write(self.switch_file, json.dumps({"model": self.model_tag, "drop": sorted(missing)}).encode())
+        return len(users) - len(missing), sorted(missing)
+
+    def apply_switch(self):
+        """Replace the live gallery with the re-embedded one, if switch_over() marked it ready.
+
+        Call it before serving, in a process running ``model_tag``. Users
+        registered, re-registered or deleted since switch_over() are caught
+        up: a staged template is only used while the user's kept images are
+        still the ones it was computed from, and the rest keep their stored
+        record (re-embedded by the next run of the job). Returns
+        ``(users, not_switched)``, or None when no switch is pending.
+        """
+        try:
+            with open(self.switch_file, "r") as f:
+                switch = json.load(f)
+        except FileNotFoundError:
+            return None
+        if switch["model"] != self.model_tag:
+            print(f"Warning: Not switching to the gallery re-embedded for {switch['model']}: "
+                  f"this server runs {self.model_tag}")
+            return None
+
+        with storage_lock(self.data_file), self._lock:
+            records = load_data(self.data_file)
+            staged = self.staged()
+            switched = []
+            not_switched = []
+            seen = set()
+            for record in records:
+                name = record.get("name")
+                if name in seen:
+                    continue  # Users with several pre-template rows get one template
+                seen.add(name)
+                if model_tag_of(record) == self.model_tag:
+                    switched.append(record)
+                    continue
+                entry = staged.get(name)
+                current = entry is not None and entry["images"] == self.images.files(name)
+                if current and "template" in entry:
+                    metadata = {k: v for k, v in record.items() if k not in TEMPLATE_FIELDS}
+                    switched.append(dict(metadata, **entry["template"]))
+                elif not (current and name in switch["drop"]):
+                    switched.append(record)
+                    not_switched.append(name)
+            save_data(self.data_file, switched)
+
+            for path in (self.switch_file, self.staging_file):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return len(switched), not_switched
+
+
+def apply_pending_switch(data_file, images):
+    """Apply a re-embedded gallery staged by scripts/reembed_gallery.py (see ReembedJob.apply_switch)."""
+    return ReembedJob(data_file, images, None, None, None).apply_switch()
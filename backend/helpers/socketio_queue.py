@@ -0,0 +1,89 @@
+# helpers/socketio_queue.py
+
+import atexit
+import glob
+import os
+import pickle
+import socket
+import uuid
+from socketio import PubSubManager
+
+LOCAL_SCHEME = "local://"
+
+
+class LocalQueueManager(PubSubManager):
+    """Socket.IO message queue for processes on one machine, with no broker.
+
+    Stand-in for Redis/Kombu when every worker runs on the same host (and
+    for testing scripts/serve.py): each process binds a Unix datagram socket
+    in ``directory`` and a publish is sent to every socket found there.
+    Sockets of processes that died are removed on the next publish.
+
+    URL: ``local:///path/to/directory``
+    """
+    name = "local"
+
+    def __init__(self, url, channel="flask-socketio", write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.directory = url[len(LOCAL_SCHEME):] if url.startswith(LOCAL_SCHEME) else url
+        self._sender = None
+        self._receiver = None
+        self._pid = None
+
+    def initialize(self):
+        # Managers created before a fork would otherwise share one identity
+        self.host_id = uuid.uuid4().hex
+        super().initialize()
+
+    def _ensure_sockets(self):
+        if self._pid == os.getpid():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._receiver = None
+        if not self.write_only:
+            path = os.path.join(self.directory, f"{self.channel}-{self.host_id}.sock")
+            self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._receiver.bind(path)
+            atexit.register(_remove, path)
+        self._pid = os.getpid()
+
+    def _publish(self, data):
+        self._ensure_sockets()
+        # Pickled like RedisManager does, so binary payloads survive
+        payload = pickle.dumps({"channel": self.channel, "data": data})
+        for path in glob.glob(os.path.join(self.directory, f"{self.channel}-*.sock")):
+            try:
+                self._sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Nobody listening any more: the process that bound it is gone
+                _remove(path)
+            except OSError as e:
+                print(f"Socket.IO queue: could not publish to {path}: {str(e)}")
+
+    def _listen(self):
+        self._ensure_sockets()
+        while True:
+            message = pickle.loads(self._receiver.recv(1 << 20))
+            if message.get("channel") == self.channel:
+                yield message["data"]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def message_queue_options(url, channel="flask-socketio"):
+    """SocketIO() keyword arguments for SOCKETIO_MESSAGE_QUEUE in config.py.
+
+    ``local://`` URLs use LocalQueueManager; anything else (``redis://``,
+    ``amqp://``, ...) is handed to Flask-SocketIO's own message queue support.
+    """
+    if not url:
+        return {}
+    if url.startswith(LOCAL_SCHEME):
+        return {"client_manager": LocalQueueManager(url, channel=channel)}
+    return {"message_queue": url, "channel": channel}
@@ -0,0 +1,83 @@
+# helpers/templates.py
+
+import numpy as np
+
+
+def new_template(embeddings, max_exemplars):
+    """Template fields for a user enrolled from one or more embeddings.
+
+    ``embedding`` is the mean of all images, ``template_count`` how many went
+    into it, and ``exemplars`` a small, diverse subset of the raw embeddings.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    exemplars = np.empty((0, embeddings.shape[1]), dtype=np.float32)
+    for embedding in embeddings:
+        exemplars = add_exemplar(exemplars, embedding, max_exemplars)
+    return {
+        "embedding": embeddings.mean(axis=0).tolist(),
+        "template_count": len(embeddings),
+        "exemplars": exemplars.tolist(),
+    }
+
+
+def update_template(record, embedding, max_exemplars, max_count):
+    """Return ``record`` with ``embedding`` folded into its template.
+
+    The mean is a running average; once ``template_count`` reaches
+    ``max_count`` new images keep a fixed weight, so the template can follow
+    gradual changes in appearance instead of freezing.
+    """
+    embedding = np.asarray(embedding, dtype=np.float32)
+    mean = np.asarray(record["embedding"], dtype=np.float32)
+    count = record.get("template_count", 1)
+    weight = 1.0 / min(count + 1, max_count)
+
+    exemplars = np.asarray(record.get("exemplars") or [record["embedding"]], dtype=np.float32)
+    updated = dict(record)
+    updated["embedding"] = (mean + (embedding - mean) * weight).tolist()
+    updated["template_count"] = count + 1
+    updated["exemplars"] = add_exemplar(exemplars.reshape(-1, mean.shape[0]), embedding, max_exemplars).tolist()
+    return updated
+
+
+def merge_template(record, other, max_exemplars, max_count):
+    """Return ``record`` with the template of ``other`` (enrolled from new images) folded in.
+
+    The generalisation of update_template to ``other["template_count"]``
+    images at once: their mean counts as that many updates, and their
+    exemplars are offered to the exemplar set one by one.
+    """
+    mean = np.asarray(record["embedding"], dtype=np.float32)
+    count = record.get("template_count", 1)
+    added = other.get("template_count", 1)
+    weight = min(1.0, added / min(count + added, max_count))
+
+    exemplars = np.asarray(record.get("exemplars") or [record["embedding"]], dtype=np.float32).reshape(-1, mean.shape[0])
+    for embedding in np.asarray(other.get("exemplars") or [other["embedding"]], dtype=np.float32).reshape(-1, mean.shape[0]):
+        exemplars = add_exemplar(exemplars, embedding, max_exemplars)
+    updated = dict(record)
+    updated["embedding"] = (mean + (np.asarray(other["embedding"], dtype=np.float32) - mean) * weight).tolist()
+    updated["template_count"] = count + added
+    updated["exemplars"] = exemplars.tolist()
+    return updated
+
+
+def add_exemplar(exemplars, embedding, max_exemplars):
+    """Add ``embedding`` to a bounded exemplar set, keeping the set spread out.
+
+    When the set is full the new embedding replaces the most redundant
+    exemplar (the one closest to another), but only if that makes the set more
+    diverse.
+    """
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+    if len(exemplars) < max_exemplars:
+        return np.vstack([exemplars, embedding])
+
+    pairwise = np.linalg.norm(exemplars[:, None, :] - exemplars[None, :, :], axis=2)
+    np.fill_diagonal(pairwise, np.inf)
+    redundant = int(np.argmin(pairwise.min(axis=1)))
+    others = np.delete(exemplars, redundant, axis=0)
+    if np.linalg.norm(others - embedding, axis=1).min() > pairwise[redundant].min():
+        exemplars = exemplars.copy()
+        exemplars[redundant] = embedding
+    return exemplars
@@ -0,0 +1,110 @@
+# helpers/user_index.py
+
+import bisect
+import hashlib
+import json
+from collections import Counter
+from helpers.data_storage import load_metadata, data_version
+
+SORT_KEYS = ("name", "registered", "role")
+LISTING_FIELDS = ("name", "role", "registration_date", "registration_time", "model")  # What /api/users shows
+
+
+class UserIndex:
+    """Sorted, metadata-only snapshot of the registered users, for /api/users.
+
+    Built from the stored metadata rows (LISTING_FIELDS only), so listing
+    users doesn't read or parse any embedding data, and users the gallery
+    doesn't match (e.g. embedded with another model) are still listed. Names are
+    kept sorted (case-insensitively) for prefix search with bisect; other
+    sort orders are computed on first use. ``etag`` is a digest of the
+    contents, so it is the same in every worker process serving the same
+    data.
+    """
+
+    def __init__(self, users):
+        users = [{k: user[k] for k in LISTING_FIELDS if k in user} for user in users]
+        serialized = [json.dumps(user, sort_keys=True, default=str) for user in users]
+        # Fully deterministic order (ties broken on the whole record), so the digest is too
+        order = sorted(range(len(users)), key=lambda i: (_fold(users[i].get("name")), _registered(users[i]),
+                                                         serialized[i]))
+        self.users = [users[i] for i in order]
+        self._names = [_fold(user.get("name")) for user in self.users]
+        self._orders = {}  # sort key -> positions in that order
+
+        digest = hashlib.sha1()
+        for i in order:
+            digest.update(serialized[i].encode())
+            digest.update(b"\n")
+        self.etag = digest.hexdigest()
+
+    def __len__(self):
+        return len(self.users)
+
+    def query(self, prefix=None, sort="name", descending=False, limit=None, offset=0):
+        """Return ``(users, total)``: one page of users, and how many matched before paging.
+
+        ``prefix`` matches the start of the name, ignoring case.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        if prefix:
+            prefix = _fold(prefix)
+            start = bisect.bisect_left(self._names, prefix)
+            end = bisect.bisect_left(self._names, prefix + "\U0010ffff", start)
+            positions = range(start, end)
+            if sort != "name":
+                positions = sorted(positions, key=self._sort_key(sort))
+        else:
+            positions = range(len(self.users)) if sort == "name" else self._order(sort)
+
+        total = len(positions)
+        if descending:
+            positions = positions[::-1]
+        end = total if limit is None else offset + limit
+        return [self.users[i] for i in positions[offset:end]], total
+
+    def _order(self, sort):
+        if sort not in self._orders:
+            self._orders[sort] = sorted(range(len(self.users)), key=self._sort_key(sort))
+        return self._orders[sort]
+
+    def _sort_key(self, sort):
+        if sort == "registered":
+            return lambda i: (_registered(self.users[i]), self._names[i])
+        return lambda i: (_fold(self.users[i].get(sort)), self._names[i])
+
+
+def _fold(value):
+    return str(value or "").casefold()
+
+
+def _registered(user):
+    """Sortable registration timestamp; records store DD-MM-YYYY and HH:MM:SS."""
+    date = str(user.get("registration_date") or "")
+    return "-".join(reversed(date.split("-"))) + " " + str(user.get("registration_time") or "")
+
+
+_index = None
+_index_key = None
+_index_listing = None  # Counter of the LISTING_FIELDS tuples _index was built from
+
+
+def get_user_index(file_path):
+    """Return the UserIndex of the users stored in ``file_path``.
+
+    The metadata is only re-read after a write to the storage, and the index
+    only rebuilt when a listed field changed: template updates from logins
+    keep the same index and ETag.
+    """
+    global _index, _index_key, _index_listing
+    key = (file_path, data_version(file_path))
+    if _index is not None and _index_key == key:
+        return _index
+    users = load_metadata(file_path, LISTING_FIELDS)
+    listing = Counter(tuple(user.get(k) for k in LISTING_FIELDS) for user in users)
+    if _index is None or _index_key[0] != file_path or _index_listing != listing:
+        _index = UserIndex(users)
+        _index_listing = listing
+    _index_key = key
+    return _index
@@ -1,14 +1,25 @@
 # routes/api_routes.py
 
-from flask import Blueprint, request, jsonify
-from helpers.data_storage import load_data, save_data
-from config import DATA_FILE, LOG_FILE
-from datetime import datetime
-import os
+from flask import Blueprint, request, jsonify, Response
+from helpers.data_storage import delete_user
+from helpers.bulk_enrollment import collect_from_zip, enroll, save_enrolled
+from helpers.enrollment_images import get_enrollment_images, retain_bulk_images
+from helpers.gallery import get_gallery
+from helpers.login_log import LoginLogStore
+from helpers.inference_pool import get_inference_pool
+from helpers.model_lifecycle import status as model_status
+from helpers.frame_processing import gate_counters
+from helpers.frame_cache import frame_cache
+from helpers.user_index import get_user_index, SORT_KEYS
+from config import (DATA_FILE, LOG_FILE, LOG_DB_FILE, MAX_LOG_PAGE_SIZE, MAX_USER_PAGE_SIZE, MAX_FRAME_WIDTH,
+                    PROCESSING_TIMEOUT, BULK_MAX_IMAGES, TEMPLATE_MAX_EXEMPLARS)
+import zipfile
 
 # Create a Blueprint for API routes
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+login_log = LoginLogStore(LOG_DB_FILE, legacy_json_path=LOG_FILE)
+
 # --- API Endpoint to Record Login Log ---
 @api_bp.route('/log-login', methods=['POST'])
 def record_login_log():
@@ -20,23 +31,8 @@ def record_login_log():
     if not username or not login_date or not login_time:
         return jsonify({"error": "Username, date, and time are required"}), 400
 
-    log_entry = {
-        "name": username,
-        "date": login_date,
-        "time": login_time
-    }
-
     try:
-        # Load existing logs or initialize if file doesn't exist
-        if os.path.exists(LOG_FILE):
-            logs = load_data(LOG_FILE)
-            if not isinstance(logs, list): # Handle case where file might be corrupted/empty
-                 logs = []
-        else:
-            logs = []
-
-        logs.append(log_entry)
-        save_data(LOG_FILE, logs)
+        login_log.record(username, login_date, login_time)
         return jsonify({"message": "Login logged successfully"}), 201
     except Exception as e:
         print(f"Error logging login: {str(e)}")
@@ -47,14 +43,33 @@ def record_login_log():
 def get_all_users():
     # !! IMPORTANT: Add authentication/authorization check here later
     # to ensure only admins can access this !!
+    prefix = request.args.get('q') # Optional name prefix, case-insensitive
+    sort = request.args.get('sort', default='name') # 'name', 'registered' or 'role'
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"sort must be one of: {', '.join(SORT_KEYS)}"}), 400
+    descending = request.args.get('order') == 'desc'
+
+    # Optional pagination; without ?limit= every matching user is returned
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', default=0, type=int)
+    if limit is not None:
+        limit = max(0, min(limit, MAX_USER_PAGE_SIZE))
+    offset = max(0, offset)
+
     try:
-        users = load_data(DATA_FILE)
-        # Remove embeddings before sending to frontend for security and size
-        users_without_embeddings = [
-            {k: v for k, v in user.items() if k != 'embedding'}
-            for user in users
-        ]
-        return jsonify(users_without_embeddings)
+        # Stored metadata only: no embeddings are read, and users the gallery skips are listed too
+        index = get_user_index(DATA_FILE)
+        # Same data, same listing: answer revalidations without building a response body
+        if request.if_none_match.contains(index.etag):
+            response = Response(status=304)
+        else:
+            users, total = index.query(prefix, sort, descending, limit, offset)
+            response = jsonify(users)
+            # Total before pagination, so dashboards can render page controls
+            response.headers['X-Total-Count'] = str(total)
+        response.set_etag(index.etag)
+        response.headers['Cache-Control'] = 'no-cache' # Browsers revalidate with If-None-Match
+        return response
     except Exception as e:
         print(f"Error fetching users: {str(e)}")
         return jsonify({"error": "Failed to fetch users"}), 500
@@ -64,21 +79,23 @@ def get_all_users():
 def get_login_logs():
     # !! IMPORTANT: Add authentication/authorization check here later !!
     filter_username = request.args.get('username') # For filtering user-specific logs
+    date_from = request.args.get('from') # Optional 'YYYY-MM-DD' bounds (inclusive)
+    date_to = request.args.get('to')
 
-    try:
-        if not os.path.exists(LOG_FILE):
-             return jsonify([]) # Return empty list if log file doesn't exist
-
-        logs = load_data(LOG_FILE)
-        if not isinstance(logs, list):
-            return jsonify([]) # Return empty list if file is not a list
+    # Optional pagination; without ?limit= every matching entry is returned
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', default=0, type=int)
+    if limit is not None:
+        limit = max(0, min(limit, MAX_LOG_PAGE_SIZE))
+    offset = max(0, offset)
+    newest_first = request.args.get('order') == 'desc' # Dashboards show the latest logins first
 
-        if filter_username:
-            filtered_logs = [log for log in logs if log.get('name') == filter_username]
-            return jsonify(filtered_logs)
-        else:
-            # If no username filter, return all logs (for admin)
-            return jsonify(logs)
+    try:
+        logs, total = login_log.query(filter_username, date_from, date_to, limit, offset, newest_first)
+        response = jsonify(logs)
+        # Total before pagination, so dashboards can render page controls
+        response.headers['X-Total-Count'] = str(total)
+        return response
     except Exception as e:
         print(f"Error fetching login logs: {str(e)}")
         return jsonify({"error": "Failed to fetch login logs"}), 500
@@ -89,21 +106,71 @@ def delete_user_by_admin(username):
     # !! IMPORTANT: Add authentication/authorization check here later
     # to ensure only admins can access this !!
     try:
-        users = load_data(DATA_FILE)
-        user_found = False
-        updated_users = []
-        for user in users:
-            if user.get('name') == username:
-                user_found = True
-                # Don't add this user to the new list
-            else:
-                updated_users.append(user)
-
-        if not user_found:
+        if not delete_user(DATA_FILE, username):
             return jsonify({"error": "User not found"}), 404
 
-        save_data(DATA_FILE, updated_users)
+        get_gallery().remove(username)
+        images = get_enrollment_images()
+        if images is not None:
+            images.delete(username)
         return jsonify({"message": f"User '{username}' deleted successfully"})
     except Exception as e:
         print(f"Error deleting user {username}: {str(e)}")
-        return jsonify({"error": f"Failed to delete user {username}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Failed to delete user {username}"}), 500
+
+# --- API Endpoint for Bulk Registration (zip of labelled images) ---
+@api_bp.route('/register/bulk', methods=['POST'])
+def register_bulk():
+    # !! IMPORTANT: Add authentication/authorization check here later
+    # to ensure only admins can access this !!
+    archive = request.files.get("archive")
+    role = request.form.get("role", "user")
+    if not archive:
+        return jsonify({"error": "A zip archive of labelled images is required"}), 400
+
+    try:
+        items = collect_from_zip(archive.stream)
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Archive is not a valid zip file"}), 400
+    if not items:
+        return jsonify({"error": "No images found in archive"}), 400
+    if len(items) > BULK_MAX_IMAGES:
+        return jsonify({"error": f"Too many images (max {BULK_MAX_IMAGES})"}), 400
+
+    try:
+        records, report = enroll(items, role, get_inference_pool(), MAX_FRAME_WIDTH, PROCESSING_TIMEOUT,
+                                 TEMPLATE_MAX_EXEMPLARS)
+        # New identities are committed in one write; existing ones fold into their templates
+        save_enrolled(records, report)
+        images = get_enrollment_images()
+        if images is not None:
+            retain_bulk_images(images, items, report)
+        return jsonify(report)
+    except Exception as e:
+        print(f"Error in bulk registration: {str(e)}")
+        return jsonify({"error": f"Bulk registration failed: {str(e)}"}), 500
+
+# --- API Endpoint to Report Inference Batching / Face Gate Stats ---
+@api_bp.route('/inference/stats', methods=['GET'])
+def get_inference_stats():
+    pool = get_inference_pool()
+    return jsonify(dict(pool.stats(), pending=pool.pending, face_gate=dict(gate_counters),
+                        frame_cache=frame_cache.stats()))
+
+# --- API Endpoint for Readiness Checks ---
+@api_bp.route('/health', methods=['GET'])
+def health():
+    pool = get_inference_pool()
+    if pool.size == 0:
+        # Inline inference: the models live in this process
+        ready = model_status()["loaded"]
+    else:
+        ready = pool.ready_workers > 0
+    body = {
+        "status": "ready" if ready else "starting",
+        "workers": pool.size,
+        "ready_workers": pool.ready_workers,
+        "models": model_status(),
+        "users": len(get_gallery()),
+    }
+    return jsonify(body), 200 if ready else 503
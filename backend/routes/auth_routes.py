@@ -1,10 +1,14 @@
 from flask import request, jsonify
-from helpers.data_storage import load_data, save_data
-from helpers.face_recognition import extract_embedding
-import numpy as np
-import cv2
+from helpers.data_storage import append_user
+from helpers.inference_pool import get_inference_pool, InferenceBusy, InferenceTimeout
+from helpers.gallery import get_gallery, add_to_template
+from helpers.frame_processing import decode_image, face_for_embedding
+from helpers.templates import new_template
+from helpers.enrollment_images import get_enrollment_images, valid_user_name
+from helpers.face_recognition import model_tag
 from datetime import datetime  
-from config import MAX_FRAME_WIDTH, DATA_FILE
+import os
+from config import MAX_FRAME_WIDTH, DATA_FILE, PROCESSING_TIMEOUT, TEMPLATE_MAX_EXEMPLARS
 
 def register():
     name = request.form.get("name")
@@ -13,37 +17,51 @@ def register():
 
     if not name or not role or not image_file:
         return jsonify({"error": "Name, role, and image are required"}), 400
+    if not valid_user_name(name):
+        return jsonify({"error": "Invalid name"}), 400
 
     try:
+        # Decode (at reduced scale for large uploads) and resize to MAX_FRAME_WIDTH
         image_bytes = image_file.read()
-        image_array = np.frombuffer(image_bytes, dtype=np.uint8)
-        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-        
-        # Resize if too large
-        if image.shape[1] > MAX_FRAME_WIDTH:
-            scale = MAX_FRAME_WIDTH / image.shape[1]
-            image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
-
-        embedding = extract_embedding(image)
+        image = decode_image(image_bytes, MAX_FRAME_WIDTH)
+
+        # Same face gate as authentication, so stored and live embeddings are comparable
+        face, detector_backend = face_for_embedding(image)
+        if face is None:
+            return jsonify({"error": "Face not detected"}), 400
+
+        embedding = get_inference_pool().embed(face, PROCESSING_TIMEOUT, detector_backend)
         if embedding is None:
             return jsonify({"error": "Face not detected"}), 400
 
+        # Kept as uploaded, so the user can be re-embedded after a model change
+        images = get_enrollment_images()
+        if images is not None:
+            images.save(name, image_bytes, os.path.splitext(image_file.filename or "")[1] or ".jpg")
+
+        # Registering an existing name adds the image to that user's template
+        # instead of storing a duplicate user
+        if add_to_template(name, embedding) is not None:
+            return jsonify({"message": "User registered successfully"})
+
         # Prepare new user data
         new_user = {
             "name": name,
             "role": role,
             "registration_date": datetime.now().strftime("%d-%m-%Y"),
             "registration_time": datetime.now().strftime("%H:%M:%S"),
-            "embedding": embedding
+            "model": model_tag(),
+            **new_template([embedding], TEMPLATE_MAX_EXEMPLARS)
         }
 
-        # Load existing data
-        stored_data = load_data(DATA_FILE)
-        stored_data.append(new_user)
-
-        # Save updated data
-        save_data(DATA_FILE, stored_data)
+        # Save the new user (appended, not a full rewrite, with the binary store)
+        append_user(DATA_FILE, new_user)
+        get_gallery().add(new_user)
 
         return jsonify({"message": "User registered successfully"})
+    except InferenceBusy:
+        return jsonify({"error": "Server busy, please try again"}), 503
+    except InferenceTimeout:
+        return jsonify({"error": "Registration timed out, please try again"}), 504
     except Exception as e:
         return jsonify({"error": f"Registration failed: {str(e)}"}), 500
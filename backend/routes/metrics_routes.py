@@ -0,0 +1,39 @@
+from flask import Response
+from helpers import metrics
+from helpers.frame_cache import frame_cache
+from helpers.frame_processing import gate_counters
+from helpers.gallery import gallery
+from helpers.inference_pool import get_inference_pool
+from sockets.authenticate_socket import sessions
+from config import METRICS_ENABLED
+
+# State the app already keeps, read when /metrics is scraped
+metrics.Collected("faceauth_inference_pending", "Embedding jobs queued or running",
+                  lambda: get_inference_pool().pending)
+metrics.Collected("faceauth_inference_queued", "Embedding jobs waiting for a worker",
+                  lambda: get_inference_pool().queued)
+metrics.Collected("faceauth_inference_capacity", "Embedding jobs accepted before rejecting as busy",
+                  lambda: get_inference_pool().capacity)
+metrics.Collected("faceauth_inference_workers", "Inference worker processes by state",
+                  lambda: {"configured": get_inference_pool().size,
+                           "ready": get_inference_pool().ready_workers,
+                           "idle": get_inference_pool().idle_workers},
+                  labelnames=("state",))
+metrics.Collected("faceauth_socket_sessions", "Connected authentication sessions",
+                  lambda: len(sessions))
+metrics.Collected("faceauth_gallery_users", "Templates in the resident gallery",
+                  lambda: len(gallery))
+metrics.Collected("faceauth_face_gate_frames_total", "Frames checked by the face gate, by result",
+                  lambda: dict(gate_counters), kind="counter", labelnames=("result",))
+metrics.Collected("faceauth_frame_cache_lookups_total", "Frame cache lookups, by result",
+                  lambda: {"hit": frame_cache.hits, "miss": frame_cache.misses},
+                  kind="counter", labelnames=("result",))
+metrics.Collected("faceauth_frame_cache_entries", "Frames currently cached",
+                  lambda: frame_cache.stats()["entries"])
+
+
+def metrics_endpoint():
+    """Prometheus text exposition of every metric in helpers/metrics.py."""
+    if not METRICS_ENABLED:
+        return Response("Metrics are disabled (METRICS_ENABLED in config.py)\n", status=404, mimetype="text/plain")
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
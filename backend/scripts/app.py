@@ -3,6 +3,8 @@ eventlet.monkey_patch()
 
 import sys
 import os
+import time
+startup_start = time.time()
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 from flask import Flask
@@ -10,8 +12,16 @@ from flask_socketio import SocketIO
 from flask_cors import CORS
 from routes.auth_routes import register
 from routes.api_routes import api_bp # <-- Import the new Blueprint
-from sockets.authenticate_socket import authenticate
-from config import DATA_FILE, LOG_FILE # <-- Import LOG_FILE if needed elsewhere
+from routes.metrics_routes import metrics_endpoint
+from sockets.authenticate_socket import authenticate, reset_session, end_session
+from helpers.embedding_store import migrate_json_to_store
+from helpers.enrollment_images import EnrollmentImages
+from helpers.reembedding import apply_pending_switch
+from helpers.inference_pool import get_inference_pool
+from helpers.model_lifecycle import load_models
+from helpers.gallery import get_gallery
+from helpers.socketio_queue import message_queue_options
+from config import DATA_FILE, LOG_FILE, STORAGE_BACKEND, SOCKETIO_MESSAGE_QUEUE, ENROLLMENT_IMAGE_DIR # <-- Import LOG_FILE if needed elsewhere
 
 app = Flask(__name__)
 CORS(app) # Allow all origins for now, restrict in production
@@ -22,21 +32,34 @@ socketio = SocketIO(
     async_mode='eventlet',
     ping_timeout=60,
     ping_interval=30,
-    max_http_buffer_size=10 * 1024 * 1024
+    max_http_buffer_size=10 * 1024 * 1024,
+    **message_queue_options(SOCKETIO_MESSAGE_QUEUE)  # Lets scripts/serve.py workers emit to each other's clients
 )
 
 # Register HTTP routes
 app.add_url_rule('/register', view_func=register, methods=["POST"])
 app.register_blueprint(api_bp) # <-- Register the API blueprint
+app.add_url_rule('/metrics', view_func=metrics_endpoint, methods=["GET"])
 
 # Socket events
 socketio.on_event('authenticate', authenticate)
+socketio.on_event('reset_session', reset_session)
+socketio.on_event('disconnect', end_session)
 
 
+def prepare_storage():
+    """Migrate and create the data files. Run once, before any worker serves requests."""
+    # Login logs live in LOG_DB_FILE (created on first use), so only the user data may need a file
+    data_files = [DATA_FILE]
+    if STORAGE_BACKEND == 'binary':
+        # One-shot move of an existing data.json into the binary store (no-op once migrated)
+        migrated = migrate_json_to_store(DATA_FILE)
+        if migrated is not None:
+            print(f"Migrated {migrated} users from {DATA_FILE} to the binary store")
+        data_files = []
 
-if __name__ == "__main__":
     # Ensure data files exist (optional, creates empty files if not found)
-    for file_path in [DATA_FILE, LOG_FILE]:
+    for file_path in data_files:
         if not os.path.exists(file_path):
             try:
                 with open(file_path, 'w') as f:
@@ -46,5 +69,33 @@ if __name__ == "__main__":
             except IOError as e:
                  print(f"Warning: Could not create file {file_path}. Error: {e}")
 
+    # A gallery staged by scripts/reembed_gallery.py goes live once a server runs its model
+    switched = apply_pending_switch(DATA_FILE, EnrollmentImages(ENROLLMENT_IMAGE_DIR))
+    if switched is not None:
+        users, not_switched = switched
+        print(f"Switched to the re-embedded gallery: {users} users")
+        if not_switched:
+            print(f"Warning: {len(not_switched)} users changed since it was staged and still use the old model; "
+                  f"run scripts/reembed_gallery.py again")
+
+
+def start_inference(workers=None):
+    """Load the models before the first request: in the worker processes, or here when
+    inference runs inline. Readiness is reported by /api/health"""
+    pool = get_inference_pool(workers)
+    if pool.size == 0:
+        load_models()
+    else:
+        pool.start()
+    print(f"Loaded {len(get_gallery())} registered users")
+
+
+if __name__ == "__main__":
+    prepare_storage()
+    start_inference()
+    print(f"Startup took {time.time() - startup_start:.2f}s")
+
+    # Development server; use scripts/serve.py to run several worker processes.
+    # No reloader: it would run all of the above again in a child process, loading a second inference pool
     print("Starting Flask-SocketIO server...")
-    socketio.run(app, host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    socketio.run(app, host="0.0.0.0", port=5000, debug=True, use_reloader=False)
@@ -0,0 +1,264 @@
+"""
+Offline benchmark of the authentication hot path, for comparing commits.
+
+Times each stage on its own, with no network, GPU or registered users needed:
+
+- ``process_frame``: base64 and binary frames of a fixed set of synthetic test
+  images (seeded, 640x480 up to 1920x1080, JPEG and WebP)
+- ``face_gate``: the Haar face check before Facenet
+- ``extract_embedding``: one Facenet forward pass per frame, as an inference
+  worker runs it but inline, on EMBEDDING_BACKEND (needs the Facenet weights
+  in ~/.deepface or the exported model already; skipped with a note otherwise)
+- ``matching``: gallery.identify() as authenticate() calls it, over synthetic
+  galleries of random 128-d templates (1k/10k/100k by default)
+- ``load_data`` / ``save_data``: both storage backends, in a temp directory
+
+Results (p50/p95/p99 latency, ops/sec and peak RSS) are printed and, with
+``--output``, written as JSON together with the commit and library versions.
+Use scripts/load_test.py for end-to-end numbers against a running server.
+
+Usage:
+    python scripts/benchmark.py --output bench-$(git rev-parse --short HEAD).json
+    python scripts/benchmark.py --sizes 1000 10000 --skip-inference
+    python scripts/benchmark.py --images faces/   # real photos instead of synthetic frames
+"""
+
+import sys
+import os
+import json
+import time
+import base64
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import subprocess
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import cv2
+from benchmark_matcher import make_gallery, make_queries
+from helpers.frame_processing import process_frame, face_for_embedding
+from helpers.gallery import EmbeddingGallery
+from helpers.data_storage import load_data, save_data
+from helpers.embedding_store import EmbeddingStore
+from helpers import embedding_store
+from config import (MAX_FRAME_WIDTH, MATCHER_BACKEND, EMBEDDING_BACKEND, MATCH_THRESHOLD, TEMPLATE_MARGIN, TEMPLATE_CANDIDATES,
+                    IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN_SIZE)
+
+TEST_IMAGE_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def make_test_images(seed=0, sizes=TEST_IMAGE_SIZES):
+    """Deterministic synthetic frames: ``[(label, encoded_bytes)]``, JPEG and WebP per size.
+
+    A smooth background with a face-sized ellipse and some texture, so the
+    decoders and the face gate do representative work. The same seed always
+    gives the same bytes.
+    """
+    rng = np.random.default_rng(seed)
+    images = []
+    for width, height in sizes:
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+        frame = np.dstack([x / width * 200, y / height * 200, np.full_like(x, 90)]).astype(np.uint8)
+        frame = cv2.add(frame, rng.integers(0, 25, frame.shape, dtype=np.uint8))
+        center = (width // 2, height // 2)
+        axes = (height // 6, height // 4)
+        cv2.ellipse(frame, center, axes, 0, 0, 360, (150, 170, 210), -1)
+        for dx in (-axes[0] // 2, axes[0] // 2):
+            cv2.circle(frame, (center[0] + dx, center[1] - axes[1] // 4), axes[0] // 8, (40, 40, 40), -1)
+        _, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        _, webp = cv2.imencode(".webp", frame, [cv2.IMWRITE_WEBP_QUALITY, 80])
+        images.append((f"{width}x{height}.jpg", jpeg.tobytes()))
+        images.append((f"{width}x{height}.webp", webp.tobytes()))
+    return images
+
+
+def load_test_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() in (".jpg", ".jpeg", ".png", ".webp"):
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append((name, f.read()))
+    return images
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(func, iterations, warmup=3):
+    """Call ``func`` repeatedly and summarise its latency (ms) and throughput."""
+    for _ in range(warmup):
+        func()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    return summarize(np.array(latencies) * 1000, iterations / elapsed)
+
+
+def summarize(latencies_ms, ops_per_sec):
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "n": len(latencies_ms),
+        "mean_ms": round(float(np.mean(latencies_ms)), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "ops_per_sec": round(ops_per_sec, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def bench_frames(images, iterations):
+    results = {}
+    for label, data in images:
+        encoded = base64.b64encode(data).decode("ascii")
+        results[f"process_frame/base64/{label}"] = measure(lambda: process_frame(encoded, MAX_FRAME_WIDTH), iterations)
+        results[f"process_frame/binary/{label}"] = measure(lambda: process_frame(data, MAX_FRAME_WIDTH), iterations)
+        frame = process_frame(data, MAX_FRAME_WIDTH)
+        results[f"face_gate/{label}"] = measure(lambda: face_for_embedding(frame), iterations)
+    return results
+
+
+def bench_inference(images, iterations):
+    try:
+        from helpers.model_lifecycle import load_models
+        from helpers.face_recognition import extract_embeddings
+        load_models()
+    except Exception as e:
+        return {"extract_embedding": {"skipped": f"models unavailable: {str(e)}"}}
+
+    results = {}
+    for label, data in images:
+        frame = process_frame(data, MAX_FRAME_WIDTH)
+        face, detector_backend = face_for_embedding(frame)
+        if face is None:
+            # Synthetic frames have no real face: embed the whole frame, as for a gated crop
+            face, detector_backend = frame, "skip"
+        name = f"extract_embedding/{detector_backend}/{label}"
+        # What an inference worker runs for a single-frame batch; failures return None
+        # instead of raising, so check first rather than timing the error path
+        if extract_embeddings([face], [detector_backend])[0] is None:
+            results[name] = {"skipped": "no embedding produced"}
+            continue
+        results[name] = measure(lambda: extract_embeddings([face], [detector_backend]), iterations)
+    return results
+
+
+def bench_matching(sizes, queries, rng):
+    results = {}
+    options = ({"nlist": IVF_NLIST, "nprobe": IVF_NPROBE, "min_train_size": IVF_MIN_TRAIN_SIZE}
+               if MATCHER_BACKEND == "ivf" else {})
+    for size in sizes:
+        embeddings, users = make_gallery(size, rng)
+        gallery = EmbeddingGallery(backend=MATCHER_BACKEND, **options)
+        start = time.perf_counter()
+        gallery.load_matrix(embeddings, users)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        probes = iter(np.tile(make_queries(embeddings, queries, rng), (2, 1)))
+        stats = measure(lambda: gallery.identify(next(probes), MATCH_THRESHOLD, TEMPLATE_MARGIN,
+                                                 TEMPLATE_CANDIDATES), queries)
+        results[f"matching/{MATCHER_BACKEND}/{size}"] = dict(stats, build_ms=round(load_ms, 2))
+    return results
+
+
+def bench_storage(sizes, rng, iterations):
+    results = {}
+    for size in sizes:
+        embeddings, users = make_gallery(size, rng)
+        records = [dict(user, embedding=row.tolist()) for user, row in zip(users, embeddings)]
+        for backend in ("json", "binary"):
+            directory = tempfile.mkdtemp(prefix="faceauth-bench-")
+            try:
+                file_path = os.path.join(directory, "data.json")
+                if backend == "binary":
+                    EmbeddingStore(file_path).rewrite([])
+                else:
+                    save_data(file_path, [])
+                results[f"save_data/{backend}/{size}"] = measure(lambda: save_data(file_path, records),
+                                                                 iterations, warmup=1)
+                results[f"load_data/{backend}/{size}"] = measure(lambda: load_data(file_path),
+                                                                 iterations, warmup=1)
+            finally:
+                embedding_store._stores.pop(os.path.join(directory, "data.json"), None)
+                shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "matcher_backend": MATCHER_BACKEND,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "max_frame_width": MAX_FRAME_WIDTH,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Gallery sizes for the matching benchmark")
+    parser.add_argument("--storage-sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="Gallery sizes for load_data/save_data (JSON gets slow beyond 10k)")
+    parser.add_argument("--iterations", type=int, default=50, help="Calls per frame benchmark")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries per gallery size")
+    parser.add_argument("--storage-iterations", type=int, default=3)
+    parser.add_argument("--images", help="Directory of real test images instead of the synthetic set")
+    parser.add_argument("--skip-inference", action="store_true", help="Don't load Facenet")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    images = load_test_images(args.images) if args.images else make_test_images(args.seed)
+
+    results = {}
+    sections = [
+        ("frames", lambda: bench_frames(images, args.iterations)),
+        ("matching", lambda: bench_matching(args.sizes, args.queries, rng)),
+        ("storage", lambda: bench_storage(args.storage_sizes, rng, args.storage_iterations)),
+    ]
+    if not args.skip_inference:
+        # Last: TensorFlow dominates peak RSS once loaded
+        sections.append(("inference", lambda: bench_inference(images, args.iterations)))
+
+    for section, run in sections:
+        print(f"\n=== {section} ===")
+        for name, stats in run().items():
+            results[name] = stats
+            if "skipped" in stats:
+                print(f"{name:<44} skipped ({stats['skipped']})")
+            else:
+                print(f"{name:<44} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+                      f"p99 {stats['p99_ms']:9.3f} ms  {stats['ops_per_sec']:10.1f}/s")
+
+    report = {"environment": environment(), "peak_rss_mb": round(peak_rss_mb(), 1), "results": results}
+    print(f"\nPeak RSS {report['peak_rss_mb']:.1f} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Recall-vs-latency benchmark for the face matcher backends.
+
+Builds a synthetic gallery of random 128-d embeddings (one per identity) and
+queries it with noisy copies of enrolled identities plus unknown faces. The
+exact backend is the reference: "recall@1" is how often the IVF backend returns
+the same best match for an enrolled face, and "decision agreement" is how often it reaches the same
+accept/reject outcome at the authenticate() threshold of 8.
+
+Usage:
+    python scripts/benchmark_matcher.py --sizes 10000 100000 --nprobe 4 8 16
+"""
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from helpers.matchers import ExactMatcher, IVFMatcher
+
+MATCH_THRESHOLD = 8
+DIM = 128
+
+
+def make_gallery(size, rng):
+    # Spread of ~1 per dimension puts different identities ~16 apart, well above the threshold
+    embeddings = rng.normal(0.0, 1.0, size=(size, DIM)).astype(np.float32)
+    users = [{"name": f"user_{i}", "role": "user"} for i in range(size)]
+    return embeddings, users
+
+
+def make_queries(embeddings, count, rng):
+    known = rng.choice(len(embeddings), count // 2, replace=False)
+    # Same-person noise of ~0.35 per dimension gives distances around 4
+    genuine = embeddings[known] + rng.normal(0.0, 0.35, size=(len(known), DIM)).astype(np.float32)
+    impostors = rng.normal(0.0, 1.0, size=(count - len(known), DIM)).astype(np.float32)
+    return np.vstack([genuine, impostors])
+
+
+def run_queries(matcher, queries):
+    results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(matcher.search(query, k=1)[0])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+
+def summarize(label, latencies):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return f"{label:<22} p50 {p50:7.3f} ms  p95 {p95:7.3f} ms  p99 {p99:7.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for size in args.sizes:
+        embeddings, users = make_gallery(size, rng)
+        queries = make_queries(embeddings, args.queries, rng)
+        print(f"\n=== Gallery size {size} ({args.queries} queries) ===")
+
+        exact = ExactMatcher(DIM)
+        exact.build(embeddings, users)
+        reference, latencies = run_queries(exact, queries)
+        print(summarize("exact", latencies))
+
+        start = time.perf_counter()
+        ivf = IVFMatcher(DIM, nlist=args.nlist, min_train_size=0)
+        ivf.build(embeddings, users)
+        print(f"IVF build (nlist={args.nlist}): {time.perf_counter() - start:.2f} s")
+
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            results, latencies = run_queries(ivf, queries)
+            genuine = args.queries // 2
+            same_match = np.mean([r[0] is e[0] for r, e in zip(results[:genuine], reference[:genuine])])
+            same_decision = np.mean([
+                (r[1] < MATCH_THRESHOLD) == (e[1] < MATCH_THRESHOLD) and
+                (e[1] >= MATCH_THRESHOLD or r[0] is e[0])
+                for r, e in zip(results, reference)
+            ])
+            print(summarize(f"ivf nprobe={nprobe}", latencies) +
+                  f"  recall@1 {same_match:.3f}  decision agreement {same_decision:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Offline bulk registration from a directory or zip of labelled images.
+
+Layout: one sub-folder per person (``people/alice/1.jpg``, ``people/alice/2.jpg``)
+or one image per person named after them (``people/bob.jpg``). All images of a
+person are embedded into one template (mean embedding plus exemplars). New identities are
+stored in a single write; people already registered get the images folded into
+their template, as with /register. A per-image / per-identity report is printed
+(and optionally saved as JSON).
+
+Run it while the server is stopped (or restart the server afterwards) so the
+running gallery picks the new users up.
+
+Usage:
+    python scripts/bulk_register.py people/ --role user --report report.json
+    python scripts/bulk_register.py people.zip --dry-run
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from helpers.bulk_enrollment import collect_from_directory, collect_from_zip, enroll, save_enrolled
+from helpers.embedding_store import migrate_json_to_store
+from helpers.enrollment_images import get_enrollment_images, retain_bulk_images
+from helpers.inference_pool import get_inference_pool
+from config import DATA_FILE, MAX_FRAME_WIDTH, PROCESSING_TIMEOUT, STORAGE_BACKEND, TEMPLATE_MAX_EXEMPLARS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory or .zip of labelled images")
+    parser.add_argument("--role", default="user")
+    parser.add_argument("--report", help="Write the JSON report to this file")
+    parser.add_argument("--dry-run", action="store_true", help="Embed and report, but don't store anything")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        items = collect_from_directory(args.source)
+    else:
+        items = collect_from_zip(args.source)
+    if not items:
+        sys.exit(f"No images found in {args.source}")
+    print(f"Found {len(items)} images of {len({name for name, _, _ in items})} people")
+
+    start = time.time()
+    pool = get_inference_pool()
+    pool.start()
+    if not pool.wait_ready():
+        sys.exit("Inference workers failed to start")
+    records, report = enroll(items, args.role, pool, MAX_FRAME_WIDTH, PROCESSING_TIMEOUT, TEMPLATE_MAX_EXEMPLARS)
+    print(f"Embedded in {time.time() - start:.1f}s (mean batch size {pool.stats()['mean_batch_size']:.1f})")
+
+    for failure in (r for r in report["images"] if r["status"] == "failed"):
+        print(f"  FAILED {failure['file']}: {failure['error']}")
+
+    if not args.dry_run:
+        if STORAGE_BACKEND == 'binary':
+            migrate_json_to_store(DATA_FILE)
+        save_enrolled(records, report)
+        images = get_enrollment_images()
+        if images is not None:
+            retain_bulk_images(images, items, report)
+    print(f"{'Would register' if args.dry_run else 'Registered'} {report['registered']} people"
+          + (f" (and added images to {report['updated']} already registered)" if report.get("updated") else "") + ", "
+          f"{report['failed_identities']} failed ({report['failed_images']} images failed)")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Check an exported Facenet (EMBEDDING_BACKEND "onnx"/"tflite") against DeepFace.
+
+Embeds the same face crops with DeepFace's TensorFlow model and with the
+exported model, each in its own process so load time and peak RSS are
+measured separately, and reports:
+
+- equivalence: L2 distance between the two embeddings of each crop, and how
+  much the distances between pairs of crops change (what MATCH_THRESHOLD is
+  compared against), including pairs whose match decision would flip
+- latency: p50/p95/p99 for one crop and for a batch of INFERENCE_BATCH_SIZE
+- model load time and peak RSS of each process
+
+Exits with status 1 when any crop's embeddings are further apart than
+--tolerance (default: 5% of MATCH_THRESHOLD), i.e. when the existing
+threshold can't be assumed to hold for the exported model.
+
+Crops come from --images (photos are cropped by the face gate, as in
+production) or the synthetic benchmark frames; real faces give the
+meaningful numbers.
+
+Usage:
+    python scripts/compare_embedding_backends.py --backend onnx --images faces/
+    python scripts/compare_embedding_backends.py --backend tflite --model-file facenet-int8.tflite --output cmp.json
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from benchmark import make_test_images, load_test_images, measure, peak_rss_mb, environment
+from config import MATCH_THRESHOLD, INFERENCE_BATCH_SIZE, MAX_FRAME_WIDTH, ONNX_MODEL_FILE, TFLITE_MODEL_FILE
+
+
+def face_crops(images):
+    from helpers.frame_processing import process_frame, face_for_embedding
+    crops = []
+    for _, data in images:
+        frame = process_frame(data, MAX_FRAME_WIDTH)
+        face, _ = face_for_embedding(frame)
+        # Synthetic frames have no real face: embed the whole frame, as for a gated crop
+        crops.append(face if face is not None else frame)
+    return crops
+
+
+def run_backend(backend, model_file, crops, iterations, results):
+    """Child process: embed ``crops`` with ``backend`` and time it."""
+    try:
+        import config
+        config.EMBEDDING_BACKEND = backend
+        config.ONNX_MODEL_FILE = config.TFLITE_MODEL_FILE = model_file
+        from helpers.model_lifecycle import load_models
+        from helpers.face_recognition import extract_embeddings
+
+        start = time.perf_counter()
+        load_models()
+        load_seconds = time.perf_counter() - start
+        embeddings = [extract_embeddings([crop], ["skip"])[0] for crop in crops]
+        batch = crops[:INFERENCE_BATCH_SIZE]
+        results.put({
+            "backend": backend,
+            "model_file": model_file,
+            "load_seconds": round(load_seconds, 3),
+            "single": measure(lambda: extract_embeddings(batch[:1], ["skip"]), iterations),
+            f"batch_{len(batch)}": measure(lambda: extract_embeddings(batch, ["skip"] * len(batch)), iterations),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "embeddings": embeddings,
+        })
+    except Exception as e:
+        traceback.print_exc()
+        results.put({"backend": backend, "error": str(e)})
+
+
+def in_process(backend, model_file, crops, iterations):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_backend, args=(backend, model_file, crops, iterations, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def equivalence(reference, candidate):
+    """Compare two lists of embeddings of the same crops (None where no embedding was produced)."""
+    pairs = [(r, c) for r, c in zip(reference, candidate) if r is not None and c is not None]
+    missing = len(reference) - len(pairs)
+    if not pairs:
+        return {"crops": 0, "missing": missing}
+    reference = np.array([r for r, _ in pairs], dtype=np.float64)
+    candidate = np.array([c for _, c in pairs], dtype=np.float64)
+    deviation = np.linalg.norm(reference - candidate, axis=1)
+    report = {
+        "crops": len(pairs),
+        "missing": missing,
+        "embedding_l2_max": round(float(deviation.max()), 4),
+        "embedding_l2_mean": round(float(deviation.mean()), 4),
+        "reference_norm_mean": round(float(np.linalg.norm(reference, axis=1).mean()), 4),
+    }
+    if len(pairs) > 1:
+        i, j = np.triu_indices(len(pairs), k=1)
+        reference_distances = np.linalg.norm(reference[i] - reference[j], axis=1)
+        candidate_distances = np.linalg.norm(candidate[i] - candidate[j], axis=1)
+        change = np.abs(reference_distances - candidate_distances)
+        report.update(
+            pair_distance_change_max=round(float(change.max()), 4),
+            pair_distance_change_mean=round(float(change.mean()), 4),
+            decision_flips=int(np.sum((reference_distances < MATCH_THRESHOLD) != (candidate_distances < MATCH_THRESHOLD))),
+            pairs=len(change),
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["onnx", "tflite"], required=True)
+    parser.add_argument("--model-file", help="Exported model (default: ONNX_MODEL_FILE / TFLITE_MODEL_FILE)")
+    parser.add_argument("--images", help="Directory of face photos instead of the synthetic frames")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed calls per latency measurement")
+    parser.add_argument("--tolerance", type=float, default=0.05 * MATCH_THRESHOLD,
+                        help="Max allowed L2 distance between the two embeddings of a crop")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    model_file = args.model_file or (ONNX_MODEL_FILE if args.backend == "onnx" else TFLITE_MODEL_FILE)
+    images = load_test_images(args.images) if args.images else make_test_images()
+    crops = face_crops(images)
+
+    # Fresh interpreters so each process only loads its own runtime
+    multiprocessing.set_start_method("spawn")
+    runs = [in_process("deepface", None, crops, args.iterations),
+            in_process(args.backend, model_file, crops, args.iterations)]
+    for run in runs:
+        if "error" in run:
+            sys.exit(f"{run['backend']} failed: {run['error']}")
+
+    reference, candidate = (run.pop("embeddings") for run in runs)
+    report = {
+        "environment": dict(environment(), images=args.images or "synthetic"),
+        "match_threshold": MATCH_THRESHOLD,
+        "tolerance": args.tolerance,
+        "equivalence": equivalence(reference, candidate),
+        "runs": runs,
+    }
+    report["passed"] = report["equivalence"].get("embedding_l2_max", float("inf")) <= args.tolerance
+
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    if not report["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Export DeepFace's Facenet for the "onnx" or "tflite" EMBEDDING_BACKEND.
+
+Writes ONNX_MODEL_FILE / TFLITE_MODEL_FILE (config.py) unless --output is
+given. Optional weight quantization:
+
+- ``fp16``: half-precision weights (about half the size, near-identical embeddings)
+- ``int8``: 8-bit weights (ONNX: dynamic quantization; TFLite: dynamic range,
+  or full integer with --calibration-images)
+
+Needs TensorFlow (DeepFace's model) plus, for ONNX, tf2onnx and onnx
+(pip install tf2onnx onnx onnxruntime; onnxconverter-common for fp16).
+
+Always check the result against DeepFace before switching the backend:
+    python scripts/compare_embedding_backends.py --backend onnx --images faces/
+
+Usage:
+    python scripts/export_facenet.py --format onnx
+    python scripts/export_facenet.py --format tflite --quantize int8 --calibration-images faces/
+"""
+
+import sys
+import os
+import argparse
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import cv2
+from helpers.embedding_models import KerasFacenet, preprocess_face
+from config import ONNX_MODEL_FILE, TFLITE_MODEL_FILE
+
+
+def calibration_batches(directory, target_size, limit=200):
+    """Preprocessed face crops for full-integer calibration, one batch of one at a time."""
+    from benchmark import load_test_images
+    for _, data in load_test_images(directory)[:limit]:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            yield [preprocess_face(image, target_size)]
+
+
+def export_onnx(facenet, output, quantize):
+    import tensorflow as tf
+    try:
+        import tf2onnx
+        import onnx
+    except ImportError:
+        sys.exit("ONNX export needs tf2onnx and onnx: pip install tf2onnx onnx")
+
+    height, width = facenet.input_shape
+    signature = [tf.TensorSpec((None, height, width, 3), tf.float32, name="input")]
+    model, _ = tf2onnx.convert.from_keras(facenet.model, input_signature=signature, opset=13)
+    if quantize == "fp16":
+        try:
+            from onnxconverter_common import float16
+        except ImportError:
+            sys.exit("fp16 conversion needs onnxconverter-common: pip install onnxconverter-common")
+        # Float32 inputs/outputs stay, so callers don't change
+        model = float16.convert_float_to_float16(model, keep_io_types=True)
+    if quantize != "int8":
+        onnx.save(model, output)
+        return
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    with tempfile.TemporaryDirectory() as directory:
+        float_model = os.path.join(directory, "facenet.onnx")
+        onnx.save(model, float_model)
+        quantize_dynamic(float_model, output, weight_type=QuantType.QInt8)
+
+
+def export_tflite(facenet, output, quantize, calibration_images):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(facenet.model)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "fp16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8" and calibration_images:
+        # Activations too; inputs and outputs stay float32
+        converter.representative_dataset = lambda: calibration_batches(calibration_images, facenet.input_shape)
+    with open(output, "wb") as f:
+        f.write(converter.convert())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=["onnx", "tflite"], required=True)
+    parser.add_argument("--quantize", choices=["fp16", "int8"], help="Weight quantization (default: float32)")
+    parser.add_argument("--calibration-images", help="Face crops for full-integer TFLite quantization")
+    parser.add_argument("--output", help="Model file to write (default: ONNX_MODEL_FILE / TFLITE_MODEL_FILE)")
+    args = parser.parse_args()
+
+    output = args.output or (ONNX_MODEL_FILE if args.format == "onnx" else TFLITE_MODEL_FILE)
+    facenet = KerasFacenet()
+    if args.format == "onnx":
+        export_onnx(facenet, output, args.quantize)
+    else:
+        export_tflite(facenet, output, args.quantize, args.calibration_images)
+    print(f"Wrote {output} ({os.path.getsize(output) / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
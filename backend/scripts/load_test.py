@@ -0,0 +1,188 @@
+"""
+Socket.IO load generator for the ``authenticate`` event.
+
+Starts N concurrent clients against a running server. Each client sends
+frames the way the frontend does (binary attachments, or base64 with
+``--base64``) and waits for the ``auth_response`` before sending the next
+one. The server only processes every FRAME_SKIP-th frame, so each measured
+request is a burst of FRAME_SKIP frames, timed from the last one. Matched
+clients send ``reset_session`` so every request runs the full pipeline.
+
+By default every request gets a slightly different frame so the server's
+frame cache misses; ``--repeat-frame`` sends the same frame every time to
+measure the cached path instead.
+
+Reports p50/p95/p99 latency, frames/sec, response outcomes and peak RSS
+(of the server too, with ``--server-pid`` on Linux) as JSON.
+
+Needs the Socket.IO client extras: pip install "python-socketio[client]"
+
+Usage:
+    python scripts/load_test.py --clients 20 --duration 30 --output load.json
+    python scripts/load_test.py --url http://localhost:5000 --images faces/ --server-pid 1234
+"""
+
+import sys
+import os
+import json
+import time
+import base64
+import argparse
+import threading
+from collections import Counter
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import cv2
+from benchmark import make_test_images, load_test_images, peak_rss_mb, environment
+from config import FRAME_SKIP
+
+try:
+    import socketio
+except ImportError:
+    socketio = None
+
+
+def server_peak_rss_mb(pid):
+    """Peak RSS (VmHWM) of another process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class LoadClient(threading.Thread):
+    def __init__(self, index, args, frames, start_barrier):
+        super().__init__(daemon=True)
+        self.index = index
+        self.args = args
+        self.frames = frames
+        self.start_barrier = start_barrier
+        self.rng = np.random.default_rng(args.seed + index)
+        self.latencies = []
+        self.outcomes = Counter()
+        self.frames_sent = 0
+        self._response = None
+        self._received = threading.Event()
+
+    def _on_response(self, payload):
+        self._response = payload
+        self._received.set()
+
+    def _next_frame(self):
+        frame = self.frames[self.rng.integers(len(self.frames))]
+        if not self.args.repeat_frame:
+            # Paint a random block so the frame hashes differently and the server's cache misses
+            frame = frame.copy()
+            h, w = frame.shape[:2]
+            x, y = self.rng.integers(0, w - w // 8), self.rng.integers(0, h - h // 8)
+            frame[y:y + h // 8, x:x + w // 8] = self.rng.integers(0, 256, 3)
+        _, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        data = encoded.tobytes()
+        return base64.b64encode(data).decode("ascii") if self.args.base64 else data
+
+    def run(self):
+        client = socketio.Client(reconnection=False)
+        client.on("auth_response", self._on_response)
+        try:
+            client.connect(self.args.url, transports=["websocket"], wait_timeout=self.args.timeout)
+        except Exception as e:
+            self.outcomes["connect_failed"] += 1
+            print(f"Client {self.index} failed to connect: {str(e)}")
+            self.start_barrier.wait()
+            return
+
+        # Connecting is not part of the measurement: all clients start together
+        self.start_barrier.wait()
+        deadline = time.monotonic() + self.args.duration
+        try:
+            while time.monotonic() < deadline:
+                image = self._next_frame()
+                self._received.clear()
+                for _ in range(FRAME_SKIP):
+                    sent_at = time.perf_counter()
+                    client.emit("authenticate", {"image": image})
+                    self.frames_sent += 1
+                if not self._received.wait(self.args.timeout):
+                    self.outcomes["no_response"] += 1
+                    continue
+                self.latencies.append(time.perf_counter() - sent_at)
+                payload = self._response or {}
+                if "error" in payload:
+                    self.outcomes[f"error: {payload['error']}"] += 1
+                elif payload.get("status") == "pending":
+                    # Multi-frame decision still collecting frames (CONSENSUS_ENABLED)
+                    self.outcomes["pending"] += 1
+                elif payload.get("name") and payload["name"] != "Unknown":
+                    self.outcomes["matched"] += 1
+                    client.emit("reset_session")
+                else:
+                    self.outcomes["unknown"] += 1
+        finally:
+            client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds to wait for a response")
+    parser.add_argument("--images", help="Directory of test images instead of the synthetic set")
+    parser.add_argument("--base64", action="store_true", help="Send base64 strings instead of binary frames")
+    parser.add_argument("--repeat-frame", action="store_true", help="Send identical frames (frame cache hits)")
+    parser.add_argument("--server-pid", type=int, help="Also report this server process's peak RSS")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    if socketio is None or not hasattr(socketio, "Client"):
+        sys.exit('The Socket.IO client is not installed: pip install "python-socketio[client]"')
+
+    images = load_test_images(args.images) if args.images else make_test_images(args.seed, [(640, 480)])
+    frames = [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) for _, data in images]
+
+    start_barrier = threading.Barrier(args.clients + 1)
+    clients = [LoadClient(i, args, frames, start_barrier) for i in range(args.clients)]
+    for client in clients:
+        client.start()
+    start_barrier.wait()
+    start = time.monotonic()
+    for client in clients:
+        client.join()
+    elapsed = time.monotonic() - start
+
+    latencies = np.array([l for c in clients for l in c.latencies]) * 1000
+    outcomes = sum((c.outcomes for c in clients), Counter())
+    report = {
+        "environment": environment(),
+        "url": args.url,
+        "clients": args.clients,
+        "duration_s": round(elapsed, 2),
+        "frame_skip": FRAME_SKIP,
+        "frames_sent": sum(c.frames_sent for c in clients),
+        "responses": len(latencies),
+        "responses_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "frames_per_sec": round(sum(c.frames_sent for c in clients) / elapsed, 2) if elapsed else 0.0,
+        "outcomes": dict(outcomes),
+        "client_peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        report.update(p50_ms=round(float(p50), 2), p95_ms=round(float(p95), 2), p99_ms=round(float(p99), 2),
+                      mean_ms=round(float(latencies.mean()), 2))
+    if args.server_pid:
+        report["server_peak_rss_mb"] = server_peak_rss_mb(args.server_pid)
+
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
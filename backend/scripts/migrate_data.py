@@ -0,0 +1,37 @@
+"""
+One-shot migration of data.json into the binary embedding store.
+
+Writes data.store.json / data.<gen>.f32 / data.<gen>.jsonl next to DATA_FILE
+and keeps the original as data.json.migrated. The server also runs this on
+startup when STORAGE_BACKEND is "binary".
+
+Usage:
+    python scripts/migrate_data.py [path/to/data.json]
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from helpers.embedding_store import EmbeddingStore, migrate_json_to_store
+from config import DATA_FILE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data_file", nargs="?", default=DATA_FILE, help="data.json to migrate (default: DATA_FILE)")
+    args = parser.parse_args()
+
+    file_path = args.data_file
+    if EmbeddingStore(file_path).exists():
+        print(f"{file_path} already has a binary store, nothing to do")
+        return
+    if not os.path.isfile(file_path):
+        sys.exit(f"{file_path} not found")
+    migrated = migrate_json_to_store(file_path)
+    print(f"Migrated {migrated} users from {file_path}")
+
+
+if __name__ == "__main__":
+    main()
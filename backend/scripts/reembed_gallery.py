@@ -0,0 +1,109 @@
+"""
+Re-embed every registered user after a model change, and switch the gallery over.
+
+Embeddings only compare with embeddings of the same model: each stored user
+carries the tag of the pipeline it was embedded with (model_tag() in
+helpers/face_recognition.py, e.g. "Facenet/gate/deepface/2": model, face
+crops, Facenet runtime/export, MODEL_VERSION), and the server skips users
+whose tag isn't its own. Users stored before tags existed are still matched
+but are re-embedded here too. After changing any part of the tag, run this
+with the new settings to rebuild every template from the images kept in
+ENROLLMENT_IMAGE_DIR:
+
+1. Users whose tag differs are embedded in batches (--batch-users) through
+   the inference pool (--workers processes) into a staging journal next to
+   DATA_FILE. Interrupt it at any time; running it again resumes.
+2. Unless --no-switch, users registered or changed meanwhile are caught up
+   under the storage lock and the new gallery is marked ready. The live
+   gallery is left as it is.
+3. Restart the server with the new settings: on startup it replaces the
+   live gallery with the new one in a single atomic write (a server still
+   running the old model leaves it alone).
+
+Running servers keep authenticating against the old gallery until then.
+
+Users with no kept images (registered before images were kept) or no face
+found by the new model block the switch; --drop-missing removes them at
+the switch instead (they have to register again). --retry-failed embeds users whose
+previous attempt failed again.
+
+Usage:
+    python scripts/reembed_gallery.py --workers 8
+    python scripts/reembed_gallery.py --no-switch        # stage only, e.g. during the day
+    python scripts/reembed_gallery.py --drop-missing
+"""
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from helpers.data_storage import load_data
+from helpers.embedding_store import migrate_json_to_store
+from helpers.enrollment_images import EnrollmentImages
+from helpers.inference_pool import get_inference_pool
+from helpers.reembedding import ReembedJob, ReembedError
+from config import (DATA_FILE, ENROLLMENT_IMAGE_DIR, MAX_FRAME_WIDTH, PROCESSING_TIMEOUT, STORAGE_BACKEND,
+                    TEMPLATE_MAX_EXEMPLARS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, help="Inference worker processes (default: INFERENCE_WORKERS)")
+    parser.add_argument("--batch-users", type=int, default=64, help="Users embedded and staged per batch")
+    parser.add_argument("--no-switch", action="store_true", help="Only build the new gallery, keep serving the old one")
+    parser.add_argument("--drop-missing", action="store_true",
+                        help="Switch even if some users can't be re-embedded, removing them")
+    parser.add_argument("--retry-failed", action="store_true", help="Embed users whose previous attempt failed again")
+    args = parser.parse_args()
+
+    if STORAGE_BACKEND == 'binary':
+        migrate_json_to_store(DATA_FILE)
+
+    pool = get_inference_pool(args.workers)
+    job = ReembedJob(DATA_FILE, EnrollmentImages(ENROLLMENT_IMAGE_DIR), pool, MAX_FRAME_WIDTH, PROCESSING_TIMEOUT,
+                     TEMPLATE_MAX_EXEMPLARS, batch_users=args.batch_users)
+
+    records = load_data(DATA_FILE)
+    staged = job.staged()
+    names = job.pending(records, staged)
+    if args.retry_failed:
+        names += [name for name, entry in staged.items() if "error" in entry and name not in names]
+    print(f"Target model {job.model_tag}: {len({r.get('name') for r in records})} users, "
+          f"{len(staged)} already staged, {len(names)} to embed")
+
+    if not names and args.no_switch:
+        return
+    # Also needed for the switch: users registered meanwhile are embedded then
+    pool.start()
+    if not pool.wait_ready():
+        sys.exit("Inference workers failed to start")
+
+    if names:
+        start = time.time()
+
+        def progress(done, total, failed):
+            elapsed = time.time() - start
+            print(f"  {done}/{total} users ({failed} failed), {done / elapsed:.1f} users/s")
+
+        job.run(names, progress)
+
+    failed = {name: entry["error"] for name, entry in job.staged().items() if "error" in entry}
+    for name, error in sorted(failed.items()):
+        print(f"  FAILED {name}: {error}")
+
+    if args.no_switch:
+        print("Staged; run again without --no-switch to switch the gallery over")
+        return
+
+    try:
+        users, dropped = job.switch_over(drop_missing=args.drop_missing)
+    except ReembedError as e:
+        sys.exit(f"Not switching: {str(e)}. Use --drop-missing to remove them.")
+    print(f"Ready to switch to {job.model_tag}: {users} users" + (f", dropping {', '.join(dropped)}" if dropped else ""))
+    print("Restart the server with the new model to switch the gallery over")
+
+
+if __name__ == "__main__":
+    main()
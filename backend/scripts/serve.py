@@ -0,0 +1,121 @@
+"""
+Production launcher: WEB_WORKERS eventlet processes serving one port.
+
+The parent prepares the data files, opens the listening socket and forks
+the workers; each worker accepts connections on the shared socket and runs
+its own inference pool (INFERENCE_WORKERS split between the workers).
+Workers that exit are restarted. SIGTERM/SIGINT stop all of them.
+
+Every worker maps the binary store's rows read-only and reloads its gallery
+when another worker's /register or delete bumps the store's version file,
+so writes are visible everywhere without a restart. Socket.IO events
+emitted in one worker reach clients connected to another through
+SOCKETIO_MESSAGE_QUEUE (Redis/AMQP, or a ``local://`` directory on one
+machine).
+
+Socket.IO connections are websocket-only here: a long-polling client would
+send its requests to whichever worker accepts them, which only works with
+sticky sessions in front. The frontend already connects with websockets.
+
+Usage:
+    python scripts/serve.py
+    python scripts/serve.py --workers 2 --port 5000
+"""
+
+import eventlet
+eventlet.monkey_patch()
+
+import sys
+import os
+import time
+import uuid
+import signal
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from eventlet import wsgi
+from app import app, socketio, prepare_storage, start_inference, startup_start
+from config import (WEB_WORKERS, WEB_HOST, WEB_PORT, INFERENCE_WORKERS, STORAGE_BACKEND,
+                    SOCKETIO_MESSAGE_QUEUE)
+
+
+def run_worker(sock, inference_workers):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    manager = socketio.server.manager
+    if hasattr(manager, "host_id"):
+        # Created before the fork: each worker needs its own identity on the message queue
+        manager.host_id = uuid.uuid4().hex
+    start_inference(inference_workers)
+    print(f"Worker {os.getpid()} ready")
+    wsgi.server(sock, app, log_output=False)
+
+
+def spawn(sock, inference_workers):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(sock, inference_workers)
+        except Exception as e:
+            print(f"Worker {os.getpid()} failed: {str(e)}")
+        finally:
+            os._exit(1)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--host", default=WEB_HOST)
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork(); use scripts/app.py on this platform")
+    if args.workers > 1 and not SOCKETIO_MESSAGE_QUEUE:
+        print("Warning: SOCKETIO_MESSAGE_QUEUE is not set, so workers can't emit to each other's clients")
+    if args.workers > 1 and STORAGE_BACKEND != 'binary':
+        print("Warning: the JSON backend is not shared between workers; use STORAGE_BACKEND = 'binary'")
+
+    prepare_storage()
+    socketio.server.eio.transports = ["websocket"]
+    sock = eventlet.listen((args.host, args.port))
+    inference_workers = max(1, INFERENCE_WORKERS // args.workers) if INFERENCE_WORKERS else 0
+
+    workers = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        workers.add(spawn(sock, inference_workers))
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers "
+          f"({inference_workers} inference processes each)")
+    print(f"Startup took {time.time() - startup_start:.2f}s")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(1)
+            workers.add(spawn(sock, inference_workers))
+
+
+if __name__ == "__main__":
+    main()
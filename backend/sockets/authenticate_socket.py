@@ -1,112 +1,251 @@
 import eventlet
 import time
-import numpy as np
+from flask import request
 from flask_socketio import emit
-from threading import Semaphore
-from helpers.frame_processing import process_frame
-from helpers.face_recognition import extract_embedding
-from helpers.data_storage import load_data, save_data
-from config import MAX_CONCURRENT_PROCESSES, FRAME_SKIP, PROCESSING_TIMEOUT, DATA_FILE
+from helpers.frame_processing import process_frame, face_for_embedding, frame_hash
+from helpers.frame_cache import frame_cache
+from helpers.consensus import ConsensusWindow, LivenessCues, ACCEPT, REJECT, PENDING, STILL
+from helpers.metrics import FRAMES, STAGE_SECONDS, AUTH_DECISIONS, AUTH_DECISION_FRAMES, stage
+from helpers.inference_pool import get_inference_pool, InferenceBusy, InferenceTimeout
+from helpers.data_storage import delete_user
+from helpers.gallery import get_gallery, add_login_to_template
+from helpers.enrollment_images import get_enrollment_images
+from config import (FRAME_SKIP, PROCESSING_TIMEOUT, DATA_FILE, MAX_FRAME_WIDTH, MATCH_THRESHOLD,
+                    TEMPLATE_MARGIN, TEMPLATE_CANDIDATES, TEMPLATE_UPDATE_DISTANCE,
+                    FRAME_CACHE_ENABLED, FRAME_CACHE_HASH_SIZE, CONSENSUS_ENABLED, CONSENSUS_WINDOW,
+                    CONSENSUS_MIN_FRAMES, CONSENSUS_CONFIDENT_DISTANCE, CONSENSUS_MAX_FRAMES,
+                    CONSENSUS_REJECT_MARGIN, LIVENESS_ENABLED, LIVENESS_SIZE, LIVENESS_MIN_MOTION,
+                    LIVENESS_MAX_MOTION, LIVENESS_BLINK_RATIO, LIVENESS_REQUIRE_BLINK)
 
-# Semaphore to control concurrency
-processing_semaphore = Semaphore(MAX_CONCURRENT_PROCESSES)
-frame_counter = 0
 
-def authenticate(data):
-    global frame_counter
-    global processing_semaphore #
+class _Session:
+    """Per-connection frame pipeline state, keyed by request.sid."""
+    __slots__ = ("frame_count", "busy", "latest", "result", "attempt", "consensus", "liveness")
+
+    def __init__(self):
+        self.frame_count = 0
+        self.busy = False  # A frame of this client is being processed
+        self.latest = None  # Newest frame that arrived meanwhile (older ones are dropped)
+        self.result = None  # Final (event, payload) once the client is matched
+        self.attempt = None  # (action, username) the consensus below is collecting frames for
+        self.consensus = None  # ConsensusWindow of the current attempt
+        self.liveness = None  # LivenessCues of the current attempt
+
+
+sessions = {}
+
 
+def _is_final(result):
+    event, payload = result
+    if event == "delete_response":
+        return payload.get("status") == "deleted"
+    return bool(payload.get("name")) and payload["name"] != "Unknown"
+
+
+def authenticate(data):
     if not data or not isinstance(data, dict):
         return emit("auth_response", {"error": "Invalid data format"})
 
+    session = sessions.setdefault(request.sid, _Session())
+    if session.result is not None:
+        # Already matched: answer again without embedding more frames until the client resets
+        FRAMES.inc(outcome="already_matched")
+        return emit(*session.result)
+
+    session.frame_count += 1
+    if session.frame_count % FRAME_SKIP != 0:
+        FRAMES.inc(outcome="skipped")
+        return # Process every FRAME_SKIP-th frame of this client
+
+    if session.busy:
+        # Latest wins: the frame being processed will pick this one up next
+        if session.latest is not None:
+            FRAMES.inc(outcome="superseded")
+        session.latest = data
+        return
+
+    session.busy = True
+    try:
+        while data is not None:
+            result = process_authentication(data, session)
+            emit(*result)
+            if _is_final(result):
+                session.result = result
+                break
+            data, session.latest = session.latest, None
+    finally:
+        session.busy = False
+        session.latest = None
+
+
+def reset_session(data=None):
+    """Client asks to start over (e.g. to log in again on the same connection)."""
+    sessions.pop(request.sid, None)
+
+
+def end_session(reason=None):
+    sessions.pop(request.sid, None)
+
+
+def _decide(session, attempt, image, match, embedding, fresh):
+    """Add one frame to the session's multi-frame decision.
+
+    Returns ``(decision, frame, reason)``: ACCEPT with the best agreeing
+    ``(user, distance, embedding)``, REJECT (``reason`` is "liveness" when
+    the faces matched but never moved, "still" when only repeats of earlier
+    frames came in), or PENDING while more frames are needed.
+    """
+    if session.consensus is None or session.attempt != attempt:
+        session.attempt = attempt
+        session.consensus = ConsensusWindow(MATCH_THRESHOLD, CONSENSUS_WINDOW, CONSENSUS_MIN_FRAMES,
+                                            CONSENSUS_MAX_FRAMES, CONSENSUS_CONFIDENT_DISTANCE,
+                                            CONSENSUS_REJECT_MARGIN)
+        session.liveness = (LivenessCues(LIVENESS_MIN_MOTION, LIVENESS_MAX_MOTION, LIVENESS_BLINK_RATIO, LIVENESS_SIZE)
+                            if LIVENESS_ENABLED else None)
+    consensus = session.consensus
+    if session.liveness is not None:
+        with stage("liveness"):
+            session.liveness.observe(image)
+    if fresh:
+        consensus.add(match[0], match[1], embedding)
+    else:
+        consensus.repeat()  # Same frame again: no new evidence
+
+    decision, frame = consensus.decide()
+    reason = None
+    if decision == STILL:
+        decision, reason = REJECT, "still"
+    if decision == ACCEPT and session.liveness is not None and not session.liveness.live(LIVENESS_REQUIRE_BLINK):
+        # Matches, but no sign of a live face yet: keep collecting frames
+        out_of_frames = consensus.frames >= CONSENSUS_MAX_FRAMES or consensus.repeats >= consensus.max_repeats
+        decision, reason = (REJECT, "liveness") if out_of_frames else (PENDING, None)
+    if decision != PENDING:
+        AUTH_DECISIONS.inc(decision=reason or decision)
+        AUTH_DECISION_FRAMES.observe(consensus.frames, decision=decision)
+        session.consensus = None  # The next frame starts a new attempt
+    return decision, frame, reason
+
+
+def process_authentication(data, session=None):
+    """Authenticate (or verify for deletion) one frame. Returns the ``(event, payload)`` to emit.
+
+    With CONSENSUS_ENABLED and a ``session``, the frame only adds evidence to
+    the session's multi-frame decision, and a ``{"status": "pending"}``
+    payload is returned until that decision is made.
+    """
     # Check if this is a delete request
     action = data.get('action')
     username_to_delete = data.get('username') # Get username if action is delete
 
-    # Ab yeh line kaam karni chahiye
-    if not processing_semaphore.acquire(blocking=False):
-        # Handle delete response if busy
-        if action == 'delete':
-            return emit("delete_response", {"status": "failed", "error": "Server busy, please try again"})
-        else:
-            return emit("auth_response", {"error": "Server busy, please try again"})
-
-
     try:
         start_time = time.time()
-        frame_counter += 1
-
-        if frame_counter % FRAME_SKIP != 0:
-             # Release semaphore if skipping frame
-             processing_semaphore.release()
-             return # Important to return here
 
         image_data = data.get("image")
         if not image_data:
-             # Release semaphore if no image data
-             processing_semaphore.release()
              if action == 'delete':
-                 return emit("delete_response", {"status": "failed", "error": "Image is required for verification"})
+                 return ("delete_response", {"status": "failed", "error": "Image is required for verification"})
              else:
-                 return emit("auth_response", {"error": "Image is required"})
+                 return ("auth_response", {"error": "Image is required"})
 
 
         with eventlet.Timeout(PROCESSING_TIMEOUT):
-            image = process_frame(image_data)
-            embedding = extract_embedding(image)
+            image = process_frame(image_data, MAX_FRAME_WIDTH)
+            gallery = get_gallery()
+            gallery_version = gallery.version
+
+            # Repeated frames (retries, static scenes) reuse the cached embedding and match
+            frame_key = None
+            if FRAME_CACHE_ENABLED:
+                with stage("frame_hash"):
+                    frame_key = frame_hash(image, FRAME_CACHE_HASH_SIZE)
+            cached = frame_cache.get(frame_key, gallery_version) if frame_key else None
+            if cached is not None:
+                embedding, match = cached
+            else:
+                match = None
+                # Cheap face gate first: frames without a usable face never reach Facenet
+                face, detector_backend = face_for_embedding(image)
+                embedding = None
+                if face is not None:
+                    # Runs in an inference worker process; waits cooperatively and raises
+                    # InferenceBusy / InferenceTimeout instead of blocking the hub
+                    embedding = get_inference_pool().embed(face, PROCESSING_TIMEOUT, detector_backend)
 
             if not embedding:
+                FRAMES.inc(outcome="no_face")
+                if frame_key and cached is None:
+                    frame_cache.put(frame_key, None, None, gallery_version)
                 # If it was a delete request, send a specific failure message
                 if action == 'delete':
-                     return emit("delete_response", {"status": "failed", "error": "Face not detected for verification"})
+                     return ("delete_response", {"status": "failed", "error": "Face not detected for verification"})
                 else:
-                     return emit("auth_response", {"error": "Face not detected"})
-
+                     return ("auth_response", {"error": "Face not detected"})
 
-            stored_data = load_data(DATA_FILE)
-            best_match = None
-            matched_user = None
-            min_similarity = float('inf')
 
-            for user in stored_data:
-                # Ensure embedding exists and is a list/array before converting
-                if "embedding" in user and isinstance(user["embedding"], (list, np.ndarray)):
-                    stored_embedding = np.array(user["embedding"])
-                    similarity = np.linalg.norm(stored_embedding - np.array(embedding))
+            if match is None:
+                # One template centroid per user; exemplars only for borderline distances
+                with stage("matching"):
+                    match = gallery.identify(embedding, MATCH_THRESHOLD, TEMPLATE_MARGIN, TEMPLATE_CANDIDATES)
+                if frame_key:
+                    frame_cache.put(frame_key, embedding, match, gallery_version)
+            matched_user, min_similarity = match
+            FRAMES.inc(outcome="matched" if matched_user and min_similarity < MATCH_THRESHOLD else "unknown")
+            fresh = cached is None
 
-                    if similarity < min_similarity:
-                        min_similarity = similarity
-                        best_match = user["name"]
-                        matched_user = user
+            if CONSENSUS_ENABLED and session is not None:
+                with stage("consensus"):
+                    decision, frame, reason = _decide(session, (action, username_to_delete), image, match,
+                                                      embedding, fresh)
+                if decision == PENDING:
+                    return ("delete_response" if action == 'delete' else "auth_response",
+                            {"status": "pending", "frames": session.consensus.frames})
+                if reason in ("liveness", "still"):
+                    error = "Liveness check failed, please move slightly and try again"
+                    if action == 'delete':
+                        return ("delete_response", {"status": "failed", "error": error})
+                    return ("auth_response", {"error": error})
+                if decision == REJECT:
+                    matched_user = None
                 else:
-                    print(f"Warning: Skipping user {user.get('name', 'Unknown')} due to missing or invalid embedding.")
+                    # Answer with the closest of the agreeing frames (always a fresh one)
+                    matched_user, min_similarity, embedding = frame
+                    fresh = True
 
 
             # --- Authentication Logic ---
             # Ensure matched_user is not None before proceeding
-            if matched_user and min_similarity < 8:  # Threshold for match
+            if matched_user and min_similarity < MATCH_THRESHOLD:
                 # --- Check if Action is Delete ---
                 if action == 'delete' and matched_user['name'] == username_to_delete:
                     # Re-authentication successful for deletion
                     try:
-                        # Remove the user from the list
-                        updated_users = [user for user in stored_data if user['name'] != username_to_delete]
-                        save_data(DATA_FILE, updated_users)
+                        # Remove the user from storage
+                        delete_user(DATA_FILE, username_to_delete)
+                        gallery.remove(username_to_delete)
+                        images = get_enrollment_images()
+                        if images is not None:
+                            images.delete(username_to_delete)
                         print(f"User '{username_to_delete}' deleted successfully after re-authentication.")
                         # Send a success response for deletion
-                        return emit("delete_response", {"status": "deleted", "name": username_to_delete})
+                        return ("delete_response", {"status": "deleted", "name": username_to_delete})
                     except Exception as e:
                         print(f"Error deleting user {username_to_delete} after re-auth: {str(e)}")
-                        return emit("delete_response", {"status": "failed", "error": "Failed to delete user data"})
+                        return ("delete_response", {"status": "failed", "error": "Failed to delete user data"})
 
                 elif action == 'delete':
                      # Re-authentication successful, but face matched a DIFFERENT user than expected
                      print(f"Delete request for {username_to_delete} failed: Re-authenticated as {matched_user['name']}")
-                     return emit("delete_response", {"status": "failed", "error": "Verification face does not match the account to be deleted."})
+                     return ("delete_response", {"status": "failed", "error": "Verification face does not match the account to be deleted."})
 
                 else:
                     # Normal authentication successful
-                    return emit("auth_response", {
+                    if min_similarity < TEMPLATE_UPDATE_DISTANCE and fresh:
+                        # Confident match on a fresh frame: let the template follow the user's current appearance
+                        try:
+                            add_login_to_template(matched_user["name"], embedding, min_similarity)
+                        except Exception as e:
+                            print(f"Error updating template for {matched_user['name']}: {str(e)}")
+                    return ("auth_response", {
                         "name": matched_user["name"],
                         "role": matched_user.get("role", "user"), # Default to 'user' if role missing
                         "registration_date": matched_user.get("registration_date", ""),
@@ -115,24 +254,31 @@ def authenticate(data):
             else:
                 # Authentication failed
                 if action == 'delete':
-                    return emit("delete_response", {"status": "failed", "error": "Verification failed. Account not deleted."})
+                    return ("delete_response", {"status": "failed", "error": "Verification failed. Account not deleted."})
                 else:
-                    return emit("auth_response", {"name": "Unknown"})
+                    return ("auth_response", {"name": "Unknown"})
 
-    except eventlet.Timeout:
+    except InferenceBusy:
+        FRAMES.inc(outcome="busy")
+        if action == 'delete':
+            return ("delete_response", {"status": "failed", "error": "Server busy, please try again"})
+        else:
+            return ("auth_response", {"error": "Server busy, please try again"})
+    except (eventlet.Timeout, InferenceTimeout):
+         FRAMES.inc(outcome="timeout")
          if action == 'delete':
-             return emit("delete_response", {"status": "failed", "error": "Verification timeout"})
+             return ("delete_response", {"status": "failed", "error": "Verification timeout"})
          else:
-             return emit("auth_response", {"error": "Processing timeout"})
+             return ("auth_response", {"error": "Processing timeout"})
     except Exception as e:
         print(f"Authentication/Deletion error: {str(e)}")
+        FRAMES.inc(outcome="error")
         if action == 'delete':
-             return emit("delete_response", {"status": "failed", "error": "Processing failed during verification"})
+             return ("delete_response", {"status": "failed", "error": "Processing failed during verification"})
         else:
-             return emit("auth_response", {"error": "Processing failed"})
+             return ("auth_response", {"error": "Processing failed"})
     finally:
-        # Ensure semaphore is always released
-        processing_semaphore.release()
+        STAGE_SECONDS.observe(time.time() - start_time, stage="total")
         # Clean up image variable if it exists
         if 'image' in locals() and image is not None:
             del image
\ No newline at end of file
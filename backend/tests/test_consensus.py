@@ -0,0 +1,28 @@
+from helpers.consensus import ConsensusWindow, ACCEPT, PENDING, STILL
+
+ALICE = {"name": "alice"}
+
+
+def test_still_user_is_asked_to_move_not_rejected():
+    # 10 matching frames, 9 of them frame cache hits of the first one
+    window = ConsensusWindow(threshold=10.0, min_frames=2, max_frames=8)
+    window.add(ALICE, 4.0, [0.0])
+    decisions = []
+    for _ in range(9):
+        window.repeat()
+        decisions.append(window.decide()[0])
+    assert window.frames == 1
+    assert decisions[:7] == [PENDING] * 7
+    assert decisions[7] == STILL
+
+
+def test_repeats_do_not_use_up_the_frame_budget():
+    window = ConsensusWindow(threshold=10.0, min_frames=2, max_frames=3, max_repeats=10)
+    window.add(ALICE, 4.0, [0.0])
+    for _ in range(5):
+        window.repeat()
+        assert window.decide()[0] == PENDING
+    window.add(ALICE, 5.0, [0.1])
+    decision, (user, distance, _) = window.decide()
+    assert decision == ACCEPT
+    assert user is ALICE and distance == 4.0
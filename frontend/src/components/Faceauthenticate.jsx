@@ -12,6 +12,7 @@ const VIDEO_WIDTH = 326;
 const VIDEO_HEIGHT = 434; 
 const DETECTION_CONFIDENCE_THRESHOLD = 90; 
 const API_BASE_URL = 'http://localhost:5000/api'; 
+const MAX_UPLOAD_WIDTH = 640; // Matches MAX_FRAME_WIDTH in backend/config.py
 const SOCKET_URL = 'http://localhost:5000'; 
 
 // --- Component Definition ---
@@ -132,11 +133,11 @@ const FaceAuthentication = () => {
                                 // Re-detect face on this specific image for accurate cropping
                                 const detectionForCrop = await faceapi.detectSingleFace(image, new faceapi.SsdMobilenetv1Options({ minConfidence: 0.6 }));
                                 if (detectionForCrop) {
-                                    // Crop the detected face from the image
-                                    const croppedFaceDataUrl = cropFaceFromImage(image, detectionForCrop.box);
-                                    if (croppedFaceDataUrl) {
-                                        // Prepare payload for WebSocket emit
-                                        const payload = { image: croppedFaceDataUrl };
+                                    // Crop the detected face from the image (raw WebP bytes)
+                                    const croppedFace = await cropFaceFromImage(image, detectionForCrop.box);
+                                    if (croppedFace) {
+                                        // Prepare payload for WebSocket emit (sent as a binary attachment)
+                                        const payload = { image: croppedFace };
                                         if (authAction === 'delete') { // Add action details if deleting
                                             payload.action = 'delete';
                                             payload.username = usernameToDelete;
@@ -145,7 +146,7 @@ const FaceAuthentication = () => {
                                         // Emit the 'authenticate' event with the payload
                                         socketRef.current.emit("authenticate", payload);
                                     } else {
-                                         console.warn("Cropped face data URL was null."); // Log if cropping failed
+                                         console.warn("Cropped face was null."); // Log if cropping failed
                                     }
                                 } else {
                                      console.warn("Face not detected in screenshot for cropping."); // Log if re-detection failed
@@ -240,6 +241,8 @@ const FaceAuthentication = () => {
         // Handle 'auth_response' from backend
         socket.on("auth_response", (data) => {
             console.log("🧠 Auth response:", data);
+            // The server is still collecting frames for its decision: keep streaming
+            if (data.status === "pending") return;
 
             // Stop loading ONLY if auth failed or unknown
             // Success case handles loading implicitly via hasAuthenticatedRef
@@ -279,6 +282,7 @@ const FaceAuthentication = () => {
         // Handle 'delete_response' from backend
         socket.on("delete_response", (data) => {
             console.log("🗑️ Delete response:", data);
+            if (data.status === "pending") return; // Still verifying: keep streaming
             setLoading(false); // Stop loading
 
             if (data.status === 'deleted') {
@@ -315,7 +319,7 @@ const FaceAuthentication = () => {
     // --- Utility Functions ---
 
     // Crop face from a larger image based on bounding box
-    const cropFaceFromImage = (image, box) => {
+    const cropFaceFromImage = async (image, box) => {
         const tempCanvas = document.createElement("canvas");
         const ctx = tempCanvas.getContext("2d");
         // Ensure coordinates are valid and within image bounds
@@ -329,12 +333,15 @@ const FaceAuthentication = () => {
              return null;
         }
 
-        tempCanvas.width = width;
-        tempCanvas.height = height;
+        // Downscale large crops client-side; the backend works at MAX_FRAME_WIDTH anyway
+        const scale = Math.min(1, MAX_UPLOAD_WIDTH / width);
+        tempCanvas.width = Math.round(width * scale);
+        tempCanvas.height = Math.round(height * scale);
         // Draw the cropped part onto the temporary canvas
-        ctx.drawImage(image, x, y, width, height, 0, 0, width, height);
-        // Return as base64 WebP image data
-        return tempCanvas.toDataURL("image/webp", 0.9); // Quality 0.9
+        ctx.drawImage(image, x, y, width, height, 0, 0, tempCanvas.width, tempCanvas.height);
+        // Return raw WebP bytes (no base64 overhead)
+        const blob = await new Promise(resolve => tempCanvas.toBlob(resolve, "image/webp", 0.9)); // Quality 0.9
+        return blob ? await blob.arrayBuffer() : null;
     };
 
     // Draw the bounding box and label on the overlay canvas